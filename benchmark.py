@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from rdflib import Graph, Literal, RDFS, URIRef
+from graph_cache import load_graph, save_snapshot, PLATFORM_NAMESPACE_RE
+from profiling import reset_peak_rss, peak_rss_mb
+from catalog_schema import normalize_stream
+from label_index import LabelIndex, save_label_index
+import onto
+import convert
+
+# === Benchmarks for catalog ingestion and Excel export ===
+# Runs each phase (parse, snapshot load, build, SQL generation, serialize, export) against
+# synthetic Singer catalogs and synthetic ontologies scaled from the real one, and reports
+# wall time, peak RSS and throughput as JSON so runs can be compared.
+
+DEFAULT_ONTOLOGY = "D2C Ontology.ttl"
+
+FIELD_TYPES = [["null", "string"], ["null", "integer"], ["null", "number"], ["null", "boolean"]]
+
+
+# === Synthetic inputs ===
+
+def synthetic_item_schema(width, depth, prefix):
+    """An object schema with `width` scalar fields, an object field and, below depth 0, a nested array."""
+    properties = {"id": {"type": ["null", "integer"]}}
+    for i in range(width):
+        properties[f"{prefix}_field_{i}"] = {"type": FIELD_TYPES[i % len(FIELD_TYPES)]}
+    properties[f"{prefix}_details"] = {
+        "type": ["null", "object"],
+        "properties": {f"detail_{i}": {"type": ["null", "string"]} for i in range(max(1, width // 4))},
+    }
+    if depth > 0:
+        properties[f"{prefix}_items"] = {
+            "type": ["null", "array"],
+            "items": synthetic_item_schema(max(1, width // 2), depth - 1, f"{prefix}_item"),
+        }
+    return {"type": ["null", "object"], "properties": properties}
+
+
+def synthetic_catalog(streams, width, depth):
+    """A Singer catalog with `streams` selected streams of `width` fields and arrays nested `depth` levels deep."""
+    catalog = {"streams": []}
+    for s in range(streams):
+        name = f"stream_{s}"
+        schema = synthetic_item_schema(width, depth, name)
+        schema["type"] = "object"
+        schema["properties"]["_time_loaded"] = {"type": ["null", "string"]}
+        catalog["streams"].append({
+            "stream": name,
+            "tap_stream_id": name,
+            "key_properties": ["id"],
+            "schema": schema,
+            "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}],
+        })
+    return catalog
+
+
+def scaled_ontology(base_graph, scale):
+    """
+    Returns a graph `scale` times the size of the base: the core once, plus `scale` copies of
+    every platform namespace (copies get their own namespace and PlatformField labels).
+    """
+    if scale <= 1:
+        return base_graph
+    g = Graph()
+    for prefix, uri in base_graph.namespaces():
+        g.bind(prefix, uri, override=True, replace=True)
+
+    def rename(term, copy):
+        if isinstance(term, URIRef):
+            match = PLATFORM_NAMESPACE_RE.match(term)
+            if match:
+                start, end = match.span(1)
+                return URIRef(f"{term[:end]}{copy}{term[end:]}")
+        return term
+
+    for copy in range(scale):
+        suffix = "" if copy == 0 else str(copy + 1)
+        for s, p, o in base_graph:
+            if copy and PLATFORM_NAMESPACE_RE.match(s) is None:
+                continue  # core triples are kept once
+            if suffix:
+                s, o = rename(s, suffix), rename(o, suffix)
+                if p == RDFS.label and isinstance(o, Literal) and str(o).endswith("PlatformField"):
+                    o = Literal(f"{str(o)[:-len('PlatformField')]}{suffix}PlatformField", lang=o.language)
+            g.add((s, p, o))
+    return g
+
+
+# === Measurement ===
+
+def measure(phase, scale, fn):
+    """Runs fn() (which returns (work_count, unit)), and records wall time, peak RSS and throughput."""
+    reset_peak_rss()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        count, unit = fn()
+        seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    result = {
+        "scale": scale,
+        "phase": phase,
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "count": count,
+        "unit": unit,
+        f"{unit}_per_sec": round(count / seconds, 1) if seconds > 0 else None,
+    }
+    print(f"  {phase:<14} {seconds:8.3f}s  {result['peak_rss_mb']} MB peak  {result[f'{unit}_per_sec']} {unit}/s")
+    return result
+
+
+def generate_queries(catalog):
+    """Runs the SQL builders over every stream and top-level array of a catalog."""
+    builder = onto.Ontology.fragment("Benchmark", "benchmark", None, None, None)
+    count = 0
+    for stream in catalog["streams"]:
+        class_name = builder.string_naming(stream["stream"])
+        properties = normalize_stream(stream).properties
+        builder.construct_class_sql_query(class_name, properties, stream)
+        count += 1
+        for prop_name, prop_field in properties.items():
+            if prop_field.type == "array" and prop_field.items is not None:
+                builder.construct_nested_sql_query(stream["stream"].lower(), prop_name, prop_field.items, stream.get("key_properties", []))
+                count += 1
+    return count
+
+
+def run_scale(base_graph, scale, catalog, work_dir):
+    """Runs every phase for one ontology scale."""
+    print(f"\nScale {scale}x")
+    ttl_file = os.path.join(work_dir, f"ontology_{scale}x.ttl")
+    scaled_ontology(base_graph, scale).serialize(destination=ttl_file, format="turtle")
+    results = []
+    state = {}
+
+    def parse():
+        g = Graph()
+        g.parse(ttl_file, format="turtle")
+        state["graph"] = g
+        state["ontology_triples"] = len(g)
+        return len(g), "triples"
+    results.append(measure("parse", scale, parse))
+
+    save_snapshot(state["graph"], ttl_file)
+    save_label_index(LabelIndex.from_graph(state["graph"]), ttl_file)
+
+    def load_snapshot():
+        g = load_graph(ttl_file)
+        return len(g), "triples"
+    results.append(measure("load_snapshot", scale, load_snapshot))
+
+    def build():
+        g = state["graph"]
+        before = len(g)
+        ontology = onto.Ontology(ttl_file, None, None, "Benchmark", "benchmark", parent_category="Sales", graph=g)
+        onto.process_catalog(ontology, catalog)
+        return len(g) - before, "triples"
+    results.append(measure("build", scale, build))
+
+    results.append(measure("sql_generation", scale, lambda: (generate_queries(catalog), "queries")))
+
+    output_ttl = os.path.join(work_dir, f"output_{scale}x.ttl")
+
+    def serialize():
+        state["graph"].serialize(destination=output_ttl, format="turtle")
+        return len(state["graph"]), "triples"
+    results.append(measure("serialize", scale, serialize))
+
+    def export():
+        convert.ttl_to_excel(ttl_file, os.path.join(work_dir, f"export_{scale}x.xlsx"))
+        return state["ontology_triples"], "triples"
+    results.append(measure("export", scale, export))
+
+    return results
+
+
+def run(ontology_file, scales, streams, width, depth, output):
+    catalog = synthetic_catalog(streams, width, depth)
+    base_graph = load_graph(ontology_file)
+    work_dir = tempfile.mkdtemp(prefix="ontology-bench-")
+    try:
+        results = []
+        for scale in scales:
+            results.extend(run_scale(base_graph, scale, catalog, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"ontology": ontology_file, "scales": scales, "streams": streams, "width": width, "depth": depth},
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results saved to {output}")
+    return report
+
+
+def compare(old_file, new_file):
+    """Prints the per-phase time and memory ratio between two benchmark result files."""
+    with open(old_file) as f:
+        old = {(r["scale"], r["phase"]): r for r in json.load(f)["results"]}
+    with open(new_file) as f:
+        new = {(r["scale"], r["phase"]): r for r in json.load(f)["results"]}
+    print(f"{'scale':>5}  {'phase':<14} {'old s':>9} {'new s':>9} {'ratio':>7}  {'old MB':>8} {'new MB':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key], new[key]
+        ratio = n["seconds"] / o["seconds"] if o["seconds"] else float("nan")
+        print(f"{key[0]:>5}  {key[1]:<14} {o['seconds']:>9.3f} {n['seconds']:>9.3f} {ratio:>6.2f}x  {o['peak_rss_mb']!s:>8} {n['peak_rss_mb']!s:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalog ingestion, SQL generation, serialization and export.")
+    parser.add_argument("--ontology", default=DEFAULT_ONTOLOGY, help=f"base ontology to scale (default: {DEFAULT_ONTOLOGY})")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 5, 20], help="ontology size multipliers (default: 1 5 20)")
+    parser.add_argument("--streams", type=int, default=50, help="synthetic catalog stream count (default: 50)")
+    parser.add_argument("--width", type=int, default=20, help="scalar fields per stream (default: 20)")
+    parser.add_argument("--depth", type=int, default=2, help="array nesting depth (default: 2)")
+    parser.add_argument("--output", default="benchmark_results.json", help="results file (default: benchmark_results.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.ontology, args.scales, args.streams, args.width, args.depth, args.output)
+
+if __name__ == "__main__":
+    main()
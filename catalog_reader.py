@@ -0,0 +1,215 @@
+import json
+import re
+
+# === Incremental reader for Singer catalogs ===
+# Discovery output for wide taps can be hundreds of MB. iter_catalog_streams() reads the
+# file in chunks and yields one stream at a time: each stream's top-level members are cut
+# out as raw JSON text, the selection metadata is decoded first, and the (large) schema is
+# only decoded for selected streams. Memory is bounded by the largest single stream.
+
+CHUNK_SIZE = 1 << 20
+
+# Everything up to the next bracket, skipping whole strings; it stops at a '"' only when the buffer ends inside a string
+_TO_BRACKET = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*', re.S)
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_SCALAR_END = re.compile(r'[\s,}\]]')
+_WHITESPACE = re.compile(r'\s*')
+
+
+def is_selected(stream):
+    """
+    The selection flag of a catalog stream, read the way onto.py always has (first metadata entry).
+    Raises ValueError naming the stream when that entry or its flag is missing.
+    """
+    try:
+        return bool(stream["metadata"][0]["metadata"]["selected"])
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Stream '{stream.get('stream')}' has no selection flag in its first metadata entry ({type(e).__name__}: {e})") from e
+
+
+class _Scanner():
+    """
+    Cuts JSON values out of a file as raw text. The buffer only keeps text from the value being
+    cut (the mark) onwards; reading a chunk shifts the indices, which _more() returns.
+    """
+
+    __slots__ = ("file", "buf", "pos", "mark", "consumed")
+
+    def __init__(self, file):
+        self.file = file
+        self.buf = ""
+        self.pos = 0
+        self.mark = None
+        self.consumed = 0  # characters dropped from the front of the buffer so far
+
+    def _more(self):
+        """Reads another chunk; returns how far indices into the buffer moved, or None at the end of the file."""
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            return None
+        keep = self.pos if self.mark is None else self.mark
+        self.buf = self.buf[keep:] + chunk
+        self.consumed += keep
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark -= keep
+        return keep
+
+    def error(self, message):
+        # JSONDecodeError's own line/column count from the start of the buffer, not of the file
+        return json.JSONDecodeError(f"{message} at file character {self.consumed + self.pos}", self.buf, self.pos)
+
+    def peek(self):
+        """Skips whitespace and returns the next character ('' at the end of the file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self._more() is None:
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error(f"Expecting '{char}'")
+        self.pos += 1
+
+    def _string_end(self, quote):
+        # Returns the index just past the closing quote of the string opened at `quote`
+        while True:
+            match = _STRING_BODY.match(self.buf, quote + 1)
+            if match:
+                return match.end()
+            shift = self._more()
+            if shift is None:
+                raise self.error("Unterminated string")
+            quote -= shift
+
+    def _container_end(self, scan):
+        # Returns the index just past the object or array opened at `scan`
+        depth = 0
+        while True:
+            scan = _TO_BRACKET.match(self.buf, scan).end()
+            char = self.buf[scan:scan + 1]
+            if char in ("{", "["):
+                depth += 1
+            elif char in ("}", "]"):
+                depth -= 1
+                if depth == 0:
+                    return scan + 1
+            else:
+                # The buffer ran out, possibly inside a string, which is scanned again with more text
+                shift = self._more()
+                if shift is None:
+                    raise self.error("Unterminated object or array")
+                scan -= shift
+                continue
+            scan += 1
+
+    def raw_value(self):
+        """Returns the raw text of the next value and moves past it."""
+        first = self.peek()
+        if not first:
+            raise self.error("Expecting value")
+        self.mark = self.pos
+        try:
+            if first == '"':
+                end = self._string_end(self.pos)
+            elif first in "{[":
+                end = self._container_end(self.pos)
+            else:
+                # Number, true, false or null
+                scan = self.pos
+                while True:
+                    match = _SCALAR_END.search(self.buf, scan)
+                    if match:
+                        end = match.start()
+                        break
+                    scan = len(self.buf)
+                    shift = self._more()
+                    if shift is None:
+                        end = len(self.buf)
+                        break
+                    scan -= shift
+            text = self.buf[self.mark:end]
+            self.pos = end
+            return text
+        finally:
+            self.mark = None
+
+    def string(self):
+        """Reads a string token (an object key) and returns it decoded."""
+        if self.peek() != '"':
+            raise self.error("Expecting property name")
+        return json.loads(self.raw_value())
+
+    def members(self):
+        """Yields (key, raw value text) for the members of the next object."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.string()
+            self.expect(":")
+            yield key, self.raw_value()
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                self.pos -= 1
+                raise self.error("Expecting ',' or '}'")
+
+
+def _decode_stream(members):
+    """Decodes a stream's members, leaving out the schema of an unselected (or unnamed, so skipped) stream."""
+    stream = {key: json.loads(raw) for key, raw in members.items() if key != "schema"}
+    if "schema" in members and stream.get("stream") and is_selected(stream):
+        stream["schema"] = json.loads(members["schema"])
+    return {key: stream[key] for key in members if key in stream}
+
+
+def _iter_streams(scanner):
+    scanner.expect("[")
+    if scanner.peek() == "]":
+        scanner.pos += 1
+        return
+    while True:
+        if scanner.peek() != "{":
+            # Not a stream object; decode it as is and let the caller complain
+            yield json.loads(scanner.raw_value())
+        else:
+            yield _decode_stream(dict(scanner.members()))
+        char = scanner.peek()
+        scanner.pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            scanner.pos -= 1
+            raise scanner.error("Expecting ',' or ']'")
+
+
+def iter_catalog_streams(catalog_file):
+    """
+    Yields the streams of a Singer catalog file one at a time, in file order. Unselected
+    streams are yielded without their 'schema' member, which is never decoded.
+    """
+    with open(catalog_file, "r", encoding="utf-8-sig") as f:
+        scanner = _Scanner(f)
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+        while True:
+            key = scanner.string()
+            scanner.expect(":")
+            if key == "streams":
+                yield from _iter_streams(scanner)
+            else:
+                scanner.raw_value()
+            char = scanner.peek()
+            scanner.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                scanner.pos -= 1
+                raise scanner.error("Expecting ',' or '}'")
@@ -0,0 +1,113 @@
+# === Normalized field trees for Singer catalog streams ===
+# Each stream's JSON schema is walked once into a tree of Field records with a resolved
+# primary type, nullability, key flag and path, so ontology building and SQL generation
+# don't re-derive types from the raw schema. $ref (to the stream's own definitions),
+# anyOf / oneOf (alternatives) and allOf (merged) are resolved on the way.
+
+SCALAR_TYPES = ("string", "integer", "number", "boolean")
+
+# A self-referencing $ref is expanded at most this many times along one path
+MAX_REF_DEPTH = 8
+
+# Path segment of an array's item Field
+ITEMS_SEGMENT = "[]"
+
+
+class Field():
+    """
+    One schema node. type is the first non-null JSON type ("string" when none is given);
+    properties (objects) maps names to Fields in schema order; items (arrays) is the item
+    Field, or None when the array has no item schema. An item's path ends in ITEMS_SEGMENT,
+    and only top-level properties can be keys.
+    """
+
+    __slots__ = ("name", "path", "type", "nullable", "is_key", "format", "properties", "items")
+
+    def __init__(self, name, path, type="string", nullable=False, is_key=False, format=None):
+        self.name = name
+        self.path = path
+        self.type = type
+        self.nullable = nullable
+        self.is_key = is_key
+        self.format = format
+        self.properties = {}
+        self.items = None
+
+    def __repr__(self):
+        return f"Field({'.'.join(self.path).replace('.' + ITEMS_SEGMENT, ITEMS_SEGMENT) or '<root>'}: {self.type}{'?' if self.nullable else ''})"
+
+
+def _resolve_ref(ref, root, ref_depth):
+    if not ref.startswith("#/"):
+        print(f"Warning: Ignoring external $ref '{ref}'.")
+        return {}
+    if ref_depth >= MAX_REF_DEPTH:
+        print(f"Warning: Not expanding $ref '{ref}' past depth {MAX_REF_DEPTH} (recursive schema).")
+        return {}
+    node = root
+    for part in ref[2:].split("/"):
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(node, dict) or part not in node:
+            print(f"Warning: Could not resolve $ref '{ref}'.")
+            return {}
+        node = node[part]
+    return node
+
+
+def _flatten(schema, root, ref_depth):
+    """
+    Resolves $ref and combinators into (types, properties, items, format, ref_depth) for a schema node:
+    the declared types in order, the merged object properties and the first item schema.
+    """
+    while isinstance(schema, dict) and "$ref" in schema:
+        schema = _resolve_ref(schema["$ref"], root, ref_depth)
+        ref_depth += 1
+    if not isinstance(schema, dict):
+        return [], {}, None, None, ref_depth
+
+    types = schema.get("type", [])
+    types = list(types) if isinstance(types, list) else [types]
+    properties = dict(schema.get("properties", {}))
+    items = schema.get("items")
+    format = schema.get("format")
+
+    for combinator in ("allOf", "anyOf", "oneOf"):
+        for alternative in schema.get(combinator, []):
+            alt_types, alt_properties, alt_items, alt_format, _ = _flatten(alternative, root, ref_depth)
+            for t in alt_types:
+                if t not in types:
+                    types.append(t)
+            for name, details in alt_properties.items():
+                properties.setdefault(name, details)
+            if items is None:
+                items = alt_items
+            format = format or alt_format
+
+    # Untyped nodes that still describe an object or array
+    if not [t for t in types if t != "null"]:
+        if properties:
+            types.append("object")
+        elif items:
+            types.append("array")
+    return types, properties, items, format, ref_depth
+
+
+def normalize_schema(schema, root=None, name=None, path=(), key_properties=(), ref_depth=0):
+    """Builds the Field tree for a JSON schema node; root is the document $refs resolve against."""
+    root = schema if root is None else root
+    types, properties, items, format, ref_depth = _flatten(schema, root, ref_depth)
+    clean_types = [t for t in types if t != "null"]
+    field = Field(name, path, clean_types[0] if clean_types else "string", "null" in types,
+                  len(path) == 1 and name in key_properties, format)
+    if field.type == "object":
+        for prop_name, details in properties.items():
+            field.properties[prop_name] = normalize_schema(details, root, prop_name, path + (prop_name,), key_properties, ref_depth)
+    elif field.type == "array" and items:
+        field.items = normalize_schema(items, root, name, path + (ITEMS_SEGMENT,), key_properties, ref_depth)
+    return field
+
+
+def normalize_stream(stream):
+    """Returns the root Field of a catalog stream's schema, with the stream's key properties flagged."""
+    schema = stream.get("schema", {})
+    return normalize_schema(schema, schema, None, (), stream.get("key_properties", []))
@@ -0,0 +1,120 @@
+from array import array
+from rdflib.plugins.stores.memory import SimpleMemory
+
+# === Integer-interned triple store for onboarding runs ===
+# rdflib's Memory store keeps three nested dict-of-dict indexes over the term objects, which
+# costs several hundred bytes per triple. CompactStore interns every term to an integer id
+# once and keeps the triples as three parallel array('I') columns, with one array of triple
+# ids per subject, predicate and object as indexes. It plugs into rdflib.Graph like any store,
+# so the graph API (and Turtle serialization at the end of a run) is unchanged.
+
+DELETED = 0xFFFFFFFF
+
+
+class TermTable():
+    """Interns rdflib terms: ids[term] is the term's integer id and terms[id] the term."""
+
+    __slots__ = ("terms", "ids")
+
+    def __init__(self):
+        self.terms = []
+        self.ids = {}
+
+    def intern(self, term):
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+
+class CompactStore(SimpleMemory):
+    """
+    A context-unaware store with interned terms and typed-array triple columns.
+    Namespace bindings are SimpleMemory's; removed triples are tombstoned in place.
+    """
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration, identifier)
+        self.table = TermTable()
+        self.s, self.p, self.o = array("I"), array("I"), array("I")
+        self.by_subject = {}
+        self.by_predicate = {}
+        self.by_object = {}
+        self.live = 0
+
+    def _find(self, s, p, o):
+        # A subject has few triples, so a scan of its index is the cheapest membership test
+        columns_p, columns_o = self.p, self.o
+        for i in self.by_subject.get(s, ()):
+            if columns_p[i] == p and columns_o[i] == o and self.s[i] == s:
+                return i
+        return None
+
+    def _add_ids(self, s, p, o):
+        if self._find(s, p, o) is not None:
+            return
+        i = len(self.s)
+        self.s.append(s)
+        self.p.append(p)
+        self.o.append(o)
+        for index, key in ((self.by_subject, s), (self.by_predicate, p), (self.by_object, o)):
+            ids = index.get(key)
+            if ids is None:
+                ids = index[key] = array("I")
+            ids.append(i)
+        self.live += 1
+
+    def add(self, triple, context, quoted=False):
+        intern = self.table.intern
+        self._add_ids(intern(triple[0]), intern(triple[1]), intern(triple[2]))
+
+    def addN(self, quads):
+        intern = self.table.intern
+        add_ids = self._add_ids
+        for s, p, o, _ in quads:
+            add_ids(intern(s), intern(p), intern(o))
+
+    def _candidates(self, pattern_ids):
+        s, p, o = pattern_ids
+        if s is not None:
+            return self.by_subject.get(s, ())
+        if o is not None:
+            return self.by_object.get(o, ())
+        if p is not None:
+            return self.by_predicate.get(p, ())
+        return range(len(self.s))
+
+    def _match(self, triple_pattern):
+        """Yields the ids of the live triples matching a pattern."""
+        ids = self.table.ids
+        pattern_ids = []
+        for term in triple_pattern:
+            if term is None:
+                pattern_ids.append(None)
+                continue
+            term_id = ids.get(term)
+            if term_id is None:
+                return
+            pattern_ids.append(term_id)
+        s, p, o = pattern_ids
+        columns_s, columns_p, columns_o = self.s, self.p, self.o
+        # Snapshot the candidates so the graph can be changed while iterating
+        for i in list(self._candidates(pattern_ids)):
+            if columns_s[i] == DELETED:
+                continue
+            if (s is None or columns_s[i] == s) and (p is None or columns_p[i] == p) and (o is None or columns_o[i] == o):
+                yield i
+
+    def triples(self, triple_pattern, context=None):
+        terms = self.table.terms
+        for i in self._match(triple_pattern):
+            yield (terms[self.s[i]], terms[self.p[i]], terms[self.o[i]]), iter(())
+
+    def remove(self, triple_pattern, context=None):
+        for i in list(self._match(triple_pattern)):
+            self.s[i] = DELETED
+            self.live -= 1
+
+    def __len__(self, context=None):
+        return self.live
@@ -1,134 +1,343 @@
-import rdflib
-import pandas as pd
-
-def ttl_to_excel(ttl_file, output_excel, segregate_by_platform=True):
-    # Load the RDF graph
-    g = rdflib.Graph()
-    g.parse(ttl_file, format="turtle")
-    
-    # Namespaces for querying
-    OWL = rdflib.Namespace("http://www.w3.org/2002/07/owl#")
-    RDFS = rdflib.Namespace("http://www.w3.org/2000/01/rdf-schema#")
-    
-    # Extract classes
-    classes_query = """
-    SELECT DISTINCT 
-        ?parentClass
-        ?parentClassLabel
-        ?subClass
-        ?subClassLabel
-        ?subClassDefinition
-    WHERE {
-        ?subClass a owl:Class .
-        ?subClass rdfs:label ?subClassLabel .
-        ?subClass rdfs:isDefinedBy ?subClassDefinition .
-        ?subClass rdfs:subClassOf ?parentClass .
-        ?parentClass rdfs:label ?parentClassLabel .
-        FILTER(CONTAINS(STR(?parentClassLabel), "PlatformField"))
-    }
+import csv
+import json
+import os
+import re
+from rdflib import OWL
+from graph_cache import load_graph, file_digest, platform_of
+from ontology_index import OntologyIndex, IS_PRIMARY_KEY
+from hierarchy_index import load_hierarchy, strongly_connected_components
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for Parquet export
+    pa = pq = None
+
+# Layout version of the query bundles written by ttl_to_query_bundle
+QUERY_BUNDLE_VERSION = 1
+QUERY_BUNDLE_MANIFEST = "manifest.json"
+
+# === Data dictionary export ===
+# One row generator feeds every output format; rows are streamed to the sink platform by
+# platform, so only the (small) list of classes is held in memory, never all the rows.
+
+DATA_DICTIONARY_COLUMNS = ["Platform", "Entity", "Property Name", "Property Definition", "Property Type", "Is Primary Key"]
+
+def data_dictionary(index):
+    """
+    Yields (platform label, rows) for every '...PlatformField' parent class, where rows is a
+    generator of row dicts (DATA_DICTIONARY_COLUMNS) for the platform's entities and properties.
+    Platforms and entities come in first-seen order and entities sharing a label are merged,
+    as the Excel export always did.
+    """
+    # Group the classes (not the rows) by platform, then by entity label
+    platforms = {}
+    for parent_class_uri, parent_class_label, subclass_uri, subclass_label, _ in index.platform_field_classes():
+        entities = platforms.setdefault(str(parent_class_label), {})
+        entities.setdefault(str(subclass_label), []).append((parent_class_uri, subclass_uri))
+
+    def rows(platform, entities):
+        for entity, classes in entities.items():
+            for parent_class_uri, subclass_uri in classes:
+                for row in index.class_properties(parent_class_uri, subclass_uri):
+                    yield {
+                        "Platform": platform,
+                        "Entity": entity,
+                        "Property Name": str(row[2]),
+                        "Property Definition": str(row[3]),
+                        "Property Type": str(row[4]).replace('http://www.w3.org/2001/XMLSchema#', ''),
+                        "Is Primary Key": bool(row[5]),
+                    }
+
+    for platform, entities in platforms.items():
+        yield platform, rows(platform, entities)
+
+class XlsxSink():
+    """Writes rows to an .xlsx workbook in openpyxl's constant-memory write-only mode; optionally one sheet per platform."""
+
+    def __init__(self, path, segregate_by_platform=True):
+        from openpyxl import Workbook
+        self.path = path
+        self.segregate_by_platform = segregate_by_platform
+        self.columns = DATA_DICTIONARY_COLUMNS[1:] if segregate_by_platform else DATA_DICTIONARY_COLUMNS
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_has_header = False
+
+    def start_platform(self, platform):
+        if self.segregate_by_platform or self.sheet is None:
+            # Excel sheet names allow a maximum of 31 characters; trim if needed and remove invalid characters.
+            title = platform[:31].replace('/', '_').replace('\\', '_') if self.segregate_by_platform else "Sheet1"
+            self.sheet = self.workbook.create_sheet(title)
+            self.sheet_has_header = False
+
+    def write(self, row):
+        if not self.sheet_has_header:
+            self.sheet.append(self.columns)
+            self.sheet_has_header = True
+        self.sheet.append([row[column] for column in self.columns])
+
+    def close(self):
+        if self.sheet is None:
+            self.workbook.create_sheet("Sheet1")
+        self.workbook.save(self.path)
+
+class CsvSink():
+    """Writes rows to a CSV (or, with delimiter '\\t', TSV) file."""
+
+    def __init__(self, path, delimiter=","):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=DATA_DICTIONARY_COLUMNS, delimiter=delimiter)
+        self.writer.writeheader()
+
+    def start_platform(self, platform):
+        pass
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+class JsonLinesSink():
+    """Writes one JSON object per row."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def start_platform(self, platform):
+        pass
+
+    def write(self, row):
+        self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink():
+    """Writes rows to a Parquet file in row groups of batch_size rows (requires pyarrow)."""
+
+    def __init__(self, path, batch_size=10000):
+        if pa is None:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+        self.schema = pa.schema([(column, pa.bool_() if column == "Is Primary Key" else pa.string()) for column in DATA_DICTIONARY_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.batch = []
+
+    def start_platform(self, platform):
+        pass
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.writer.write_table(pa.Table.from_pylist(self.batch, schema=self.schema))
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+EXPORT_FORMATS = {
+    "xlsx": XlsxSink,
+    "csv": CsvSink,
+    "tsv": lambda path, **_: CsvSink(path, delimiter="\t"),
+    "jsonl": JsonLinesSink,
+    "parquet": ParquetSink,
+}
+
+def make_sink(output, format=None, segregate_by_platform=True):
+    """Returns the sink for an output file; the format defaults to the file extension."""
+    format = (format or os.path.splitext(output)[1].lstrip(".")).lower()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{format}'. Choose one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "xlsx":
+        return XlsxSink(output, segregate_by_platform)
+    return EXPORT_FORMATS[format](output)
+
+def export_data_dictionary(ttl_file, output, format=None, segregate_by_platform=True, platforms=None):
+    """
+    Streams the data dictionary (every platform entity's properties) to an XLSX, CSV, TSV, JSON Lines
+    or Parquet file. Only XLSX is split into one sheet per platform; the other formats carry a Platform column.
+    With platforms (e.g. ["Shopify"]) only the core and those platform namespaces are loaded.
+    Returns the number of rows written.
     """
-    results = g.query(classes_query)
-    classes = [row for row in g.query(classes_query)]
-
-    # print(classes)
-    
-    # Prepare data for Excel
-    data = []
-    
-    data = {}
-    for cls in classes:
-        # Unpack the class details from the query results
-        parent_class_uri = cls[0]
-        parent_class_label = str(cls[1])
-        subclass_uri = cls[2]
-        subclass_label = str(cls[3])
-        subclass_definition = str(cls[4])
-        
-        # Query properties for the current parent class and subclass
-        properties_query = f"""
-        SELECT DISTINCT 
-            ?parentPropertyLabel
-            ?propertyLabel
-            ?subpropertyLabel
-            ?subClassDefinition
-            ?subpropertyType
-            (BOUND(?isPrimaryKeyValue) AS ?isPrimaryKey)
-        WHERE {{
-            ?parentProperty a owl:DatatypeProperty .
-            ?parentProperty rdfs:label ?parentPropertyLabel .
-            ?parentProperty rdfs:domain <{parent_class_uri}> .
-            ?property rdfs:subPropertyOf+ ?parentProperty .
-            ?property rdfs:domain <{subclass_uri}> .
-            ?property rdfs:label ?propertyLabel .
-            ?subproperty rdfs:subPropertyOf+ ?property .
-            ?subproperty rdfs:label ?subpropertyLabel .
-            ?subproperty rdfs:isDefinedBy ?subClassDefinition .
-            ?subproperty rdfs:range ?subpropertyType .
-            OPTIONAL {{
-            ?subproperty <https://www.cohesyve.com/ontologies/D2C#isPrimaryKey> ?isPrimaryKeyValue .
-            }}
-        }}
-        """
-        properties = [row for row in g.query(properties_query)]
-        
-        # Organize data: group by parent class then by subclass
-        if parent_class_label not in data:
-            data[parent_class_label] = {}
-        if subclass_label not in data[parent_class_label]:
-            data[parent_class_label][subclass_label] = {
-                "definition": subclass_definition,
-                "properties": []
-            }
-        # Append property details to the subclass:
-        for row in properties:
-            property_details = {
-                "name": str(row[2]),
-                "definition": str(row[3]),
-                "type": str(row[4]).replace('http://www.w3.org/2001/XMLSchema#', ''),
-                "isPrimaryKey": bool(row[5])
-            }
-            data[parent_class_label][subclass_label]["properties"].append(property_details)
-
-    # print(data)
-    
-    # Convert to DataFrame
+    # Load the RDF graph (from the parsed-graph snapshot when the TTL is unchanged)
+    g = load_graph(ttl_file, platforms=platforms)
 
+    # Index the graph once instead of running a properties query per class; the hierarchy
+    # closure comes from its cache next to the TTL (built from the whole file when stale)
+    hierarchy = load_hierarchy(ttl_file, g if platforms is None else None)
+    index = OntologyIndex(g, hierarchy=hierarchy)
+
+    sink = make_sink(output, format, segregate_by_platform)
+    count = 0
+    try:
+        for platform, rows in data_dictionary(index):
+            sink.start_platform(platform)
+            for row in rows:
+                sink.write(row)
+                count += 1
+    finally:
+        sink.close()
+    return count
+
+def ttl_to_excel(ttl_file, output_excel, segregate_by_platform=True, platforms=None):
+    export_data_dictionary(ttl_file, output_excel, "xlsx", segregate_by_platform, platforms)
     if segregate_by_platform:
-        with pd.ExcelWriter(output_excel) as writer:
-            for parent, subclasses in data.items():
-                rows = []
-                for subclass, details in subclasses.items():
-                    for prop in details["properties"]:
-                        rows.append({
-                            "Entity": subclass,
-                            "Property Name": prop["name"],
-                            "Property Definition": prop["definition"],
-                            "Property Type": prop["type"],
-                            "Is Primary Key": prop["isPrimaryKey"],
-                        })
-                df = pd.DataFrame(rows)
-                # Excel sheet names allow a maximum of 31 characters; trim if needed and remove invalid characters.
-                sheet_name = parent[:31].replace('/', '_').replace('\\', '_')
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
         print(f"Data saved to {output_excel} with separate sheets for each platform.")
     else:
-        rows = []
-        for parent, subclasses in data.items():
-            for subclass, details in subclasses.items():
-                for prop in details["properties"]:
-                    rows.append({
-                        "Platform": parent,
-                        "Entity": subclass,
-                        "Property Name": prop["name"],
-                        "Property Definition": prop["definition"],
-                        "Property Type": prop["type"],
-                        "Is Primary Key": prop["isPrimaryKey"],
-                    })
-        df = pd.DataFrame(rows)
-
-        # Save to Excel
-        df.to_excel(output_excel, index=False)
         print(f"Data saved to {output_excel}")
 
+def query_dependencies(index):
+    """
+    Maps every class with a :query to the query classes it depends on, with the foreign keys behind each edge.
+    A class depends on the class that contains it (an object property from that class to it) and on every
+    class it references through owl:equivalentProperty (a foreign key). Links are declared in either
+    direction, so the primary key side of a link is taken as the referenced one.
+    Returns (depends_on, foreign_keys), where foreign_keys maps a class to (column, class, column) triples.
+    """
+    depends_on = {cls: set() for cls in index.queries}
+    foreign_keys = {cls: [] for cls in index.queries}
+
+    for prop, types in index.types.items():
+        if OWL.ObjectProperty not in types:
+            continue
+        for parent in index.domains.get(prop, ()):
+            for child in index.ranges.get(prop, ()):
+                if parent in depends_on and child in depends_on and parent != child:
+                    depends_on[child].add(parent)
+
+    for source, targets in index.equivalent_properties.items():
+        for target in targets:
+            prop, key = source, target
+            if source in index.primary_keys and target not in index.primary_keys:
+                prop, key = target, source
+            column = str(index.labels[prop][0]) if index.labels.get(prop) else None
+            key_column = str(index.labels[key][0]) if index.labels.get(key) else None
+            for cls in index.property_classes(prop):
+                for key_cls in index.property_classes(key):
+                    if cls not in depends_on or key_cls not in depends_on or cls == key_cls:
+                        continue
+                    depends_on[cls].add(key_cls)
+                    foreign_keys[cls].append((column, key_cls, key_column))
+    return depends_on, foreign_keys
+
+def query_stages(depends_on):
+    """
+    Groups classes into stages: every class comes after the classes it depends on, so the queries
+    within one stage are independent and can run concurrently. Classes that depend on each other
+    (a cycle of references) share a stage.
+    """
+    component_of = {}
+    components = strongly_connected_components(depends_on)
+    for number, component in enumerate(components):
+        for cls in component:
+            component_of[cls] = number
+
+    cyclic = sum(len(component) for component in components if len(component) > 1)
+    if cyclic:
+        print(f"Note: {cyclic} queries reference each other in cycles; each cycle shares a stage.")
+
+    # Tarjan emits a component only after every component it depends on
+    stage_of = {}
+    for number, component in enumerate(components):
+        parents = {component_of[parent] for cls in component for parent in depends_on[cls]} - {number}
+        stage_of[number] = 1 + max((stage_of[parent] for parent in parents), default=-1)
+
+    stages = [[] for _ in range(max(stage_of.values(), default=-1) + 1)]
+    for cls in depends_on:
+        stages[stage_of[component_of[cls]]].append(cls)
+    return [sorted(stage) for stage in stages]
+
+def ttl_to_query_bundle(ttl_file, output_dir, platforms=None):
+    """
+    Writes every :query in the ontology as a .sql file under output_dir/<Platform>/, plus a
+    manifest.json listing each query's class, platform, dependencies and foreign keys, and the
+    stages (lists of query ids) in which they can be run, so runners never need to load the RDF.
+    With platforms (e.g. ["Shopify"]) only those platforms' queries are exported. The manifest
+    carries the TTL's SHA-256 rather than a timestamp, so the same file always gives the same bundle.
+    """
+    digest = file_digest(ttl_file)
+    g = load_graph(ttl_file, platforms=platforms)
+    hierarchy = load_hierarchy(ttl_file, g if platforms is None else None)
+    index = OntologyIndex(g, is_primary_key_predicate=IS_PRIMARY_KEY, hierarchy=hierarchy)
+    depends_on, foreign_keys = query_dependencies(index)
+    stages = query_stages(depends_on)
+
+    # Remove the files of a previous bundle in the same directory; entries that resolve
+    # outside it (a stale or hand-edited manifest) are left alone
+    manifest_path = os.path.join(output_dir, QUERY_BUNDLE_MANIFEST)
+    bundle_dir = os.path.realpath(output_dir)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        for query in previous.get("queries", []):
+            stale = os.path.join(output_dir, query["file"])
+            if os.path.commonpath([bundle_dir, os.path.realpath(stale)]) != bundle_dir:
+                print(f"Warning: Not removing '{query['file']}' listed in {manifest_path}: it is outside {output_dir}.")
+                continue
+            if os.path.isfile(stale):
+                os.remove(stale)
+                stale_dir = os.path.dirname(stale)
+                if stale_dir != os.path.normpath(output_dir) and not os.listdir(stale_dir):
+                    os.rmdir(stale_dir)
+
+    # Query ids are '<Platform>/<Label>', made unique with the URI slug when labels repeat
+    ids = {}
+    used_ids = set()
+    for stage in stages:
+        for cls in stage:
+            platform = platform_of(cls) or "core"
+            label = str(index.labels[cls][0]) if index.labels.get(cls) else str(cls).rsplit("#", 1)[-1]
+            query_id = f"{platform}/{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}"
+            if query_id in used_ids:
+                query_id = f"{query_id}_{str(cls).rsplit('#', 1)[-1]}"
+            used_ids.add(query_id)
+            ids[cls] = query_id
+
+    queries = []
+    for stage_number, stage in enumerate(stages):
+        for cls in stage:
+            sql = sorted(str(q) for q in index.queries[cls])
+            if len(sql) > 1:
+                print(f"Warning: {cls} has {len(sql)} queries; exporting the first.")
+            query_id = ids[cls]
+            file_name = f"{query_id}.sql"
+            path = os.path.join(output_dir, file_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(sql[0].rstrip() + "\n")
+            queries.append({
+                "id": query_id,
+                "file": file_name,
+                "class": str(cls),
+                "label": str(index.labels[cls][0]) if index.labels.get(cls) else None,
+                "platform": platform_of(cls),
+                "stage": stage_number,
+                "depends_on": sorted(ids[parent] for parent in depends_on[cls]),
+                "foreign_keys": [
+                    {"column": column, "references": ids[target], "referenced_column": target_column}
+                    for column, target, target_column in sorted(foreign_keys[cls], key=lambda fk: (str(fk[0]), ids[fk[1]], str(fk[2])))
+                ],
+            })
+
+    manifest = {
+        "version": QUERY_BUNDLE_VERSION,
+        "ontology": os.path.basename(ttl_file),
+        "ontology_sha256": digest,
+        "stages": [[ids[cls] for cls in stage] for stage in stages],
+        "queries": queries,
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{len(queries)} queries in {len(stages)} stage(s) saved to {output_dir}")
+    return manifest
+
 # Example usage
-ttl_to_excel("D2C Ontology.ttl", "cohesyve-platform-data-points.xlsx")
\ No newline at end of file
+if __name__ == "__main__":
+    ttl_to_excel("D2C Ontology.ttl", "cohesyve-platform-data-points.xlsx")
\ No newline at end of file
@@ -0,0 +1,148 @@
+import argparse
+import os
+from rdflib import Graph, Literal
+from graph_cache import load_graph, serialize_graph
+
+# === Delta output for onboarding runs ===
+# A run only adds a few thousand triples to a multi-megabyte ontology. Instead of
+# re-serializing the whole graph, the triples added during the run are journaled and
+# appended to a delta file; compact() folds deltas back into a canonical TTL.
+# Deltas are relative to the base ontology they were produced from.
+
+DELTA_FORMATS = {"nt": "nt", "ttl": "turtle"}
+
+# Triples removed by a run (e.g. a regenerated :query literal) go to an N-Triples sidecar
+RETRACTIONS_SUFFIX = ".retract.nt"
+
+
+class JournalGraph(Graph):
+    """
+    A Graph that, once start_journal() is called, records every triple that was not already
+    present (journal) and every pre-existing triple that was removed (retracted).
+    """
+
+    journal = None
+    retracted = None
+
+    def start_journal(self):
+        self.journal = {}
+        self.retracted = {}
+
+    def _record_addition(self, triple):
+        # Re-adding a triple removed earlier in the run is no net change
+        if triple in self.retracted:
+            del self.retracted[triple]
+        else:
+            self.journal[triple] = None
+
+    def add(self, triple):
+        if self.journal is not None and triple not in self:
+            self._record_addition(triple)
+        return super().add(triple)
+
+    def addN(self, quads):
+        if self.journal is None:
+            return super().addN(quads)
+        fresh = {}
+        for s, p, o, c in quads:
+            # Duplicates within the same batch are recorded once
+            if (s, p, o) not in fresh and (s, p, o) not in self:
+                fresh[(s, p, o)] = None
+        for triple in fresh:
+            self._record_addition(triple)
+        return super().addN((s, p, o, self) for s, p, o in fresh)
+
+    def remove(self, triple):
+        if self.journal is not None:
+            for existing in list(self.triples(triple)):
+                if existing in self.journal:
+                    del self.journal[existing]
+                else:
+                    self.retracted[existing] = None
+        return super().remove(triple)
+
+
+def _nt_term(term):
+    # n3() writes multi-line literals with triple quotes, which N-Triples does not allow
+    if isinstance(term, Literal):
+        value = str(term).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+        if term.language:
+            return f'"{value}"@{term.language}'
+        if term.datatype:
+            return f'"{value}"^^<{term.datatype}>'
+        return f'"{value}"'
+    return term.n3()
+
+
+def retractions_path(destination):
+    """Returns the path of the retraction sidecar for a delta file."""
+    return f"{destination}{RETRACTIONS_SUFFIX}"
+
+
+def write_delta(g, triples, destination, format="nt", retracted=None):
+    """
+    Appends triples to a delta file. N-Triples are streamed line by line; Turtle is written
+    as a self-contained fragment (with its own @prefix lines) that can be appended to a TTL file.
+    Removed triples, if any, are appended as N-Triples to the delta's retraction sidecar.
+    """
+    if format not in DELTA_FORMATS:
+        raise ValueError(f"Unknown delta format '{format}', expected one of {sorted(DELTA_FORMATS)}")
+
+    count = 0
+    with open(destination, "a", encoding="utf-8") as f:
+        if format == "nt":
+            for s, p, o in triples:
+                f.write(f"{_nt_term(s)} {_nt_term(p)} {_nt_term(o)} .\n")
+                count += 1
+        else:
+            fragment = Graph()
+            for prefix, uri in g.namespaces():
+                fragment.bind(prefix, uri, override=True, replace=True)
+            for triple in triples:
+                fragment.add(triple)
+            count = len(fragment)
+            f.write("\n")
+            f.write(fragment.serialize(format="turtle"))
+
+    if retracted:
+        with open(retractions_path(destination), "a", encoding="utf-8") as f:
+            for s, p, o in retracted:
+                f.write(f"{_nt_term(s)} {_nt_term(p)} {_nt_term(o)} .\n")
+    return count
+
+
+def delta_format_for(path):
+    """Guesses the delta format from a file extension (.nt or .ttl)."""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in DELTA_FORMATS else "nt"
+
+
+def compact(base_ttl, delta_files, output_ttl):
+    """
+    Folds one or more delta files into the base ontology and writes a canonical TTL.
+    Each delta's retraction sidecar, if present, is applied after its additions.
+    """
+    g = load_graph(base_ttl)
+    before = len(g)
+    for delta_file in delta_files:
+        g.parse(delta_file, format=DELTA_FORMATS[delta_format_for(delta_file)])
+        retractions_file = retractions_path(delta_file)
+        if os.path.isfile(retractions_file):
+            for triple in Graph().parse(retractions_file, format="nt"):
+                g.remove(triple)
+        print(f"Applied delta {delta_file}")
+    serialize_graph(g, output_ttl)
+    print(f"Compacted {len(delta_files)} delta file(s) ({len(g) - before:+} triples) into {output_ttl}")
+    return g
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold onboarding delta files back into a canonical ontology TTL.")
+    parser.add_argument("base", help="base ontology (.ttl)")
+    parser.add_argument("deltas", nargs="+", help="delta files (.nt or .ttl) in the order they were written")
+    parser.add_argument("-o", "--output", required=True, help="compacted output ontology (.ttl)")
+    args = parser.parse_args()
+    compact(args.base, args.deltas, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import csv
+import json
+import os
+import re
+import zlib
+import numpy as np
+from rdflib import Graph, OWL, URIRef
+from graph_cache import load_graph, platform_of
+from ontology_index import OntologyIndex, IS_PRIMARY_KEY
+from hierarchy_index import load_hierarchy
+
+# === Cross-platform field matcher ===
+# Suggests owl:equivalentProperty links between the fields (datatype properties with a range)
+# of different platforms. Inverted indexes over label tokens and label trigrams ("blocks")
+# produce the candidate pairs, so only fields that share something are compared; each pair is
+# then scored in bulk with NumPy on hashed feature bitsets (label, definition, XSD range and
+# entity) and the best candidates per field and platform are written out, ranked.
+
+DEFAULT_ONTOLOGY = "D2C Ontology.ttl"
+
+XSD_PREFIX = "http://www.w3.org/2001/XMLSchema#"
+
+# Weights of the per-pair similarities; a pair without definitions on both sides spreads
+# the definition weight over the others
+WEIGHTS = {"label": 0.55, "definition": 0.15, "range": 0.1, "entity": 0.2}
+
+NUMERIC_RANGES = {"integer", "int", "long", "decimal", "float", "double", "nonNegativeInteger"}
+
+# Features are hashed into bitsets of this many bits (a multiple of 64)
+FEATURE_BITS = 1024
+
+# Blocks with more members than this (e.g. every 'id' field) say too little to be worth pairing
+MAX_BLOCK = 300
+MAX_GRAM_BLOCK = 150
+# Fields only paired through trigram blocks must share at least this many trigrams
+MIN_SHARED_GRAMS = 4
+
+# Pairs are scored in chunks to bound the size of the gathered bitset arrays
+SCORE_CHUNK = 200000
+
+TOKEN_ALIASES = {
+    "identifier": "id", "ids": "id", "qty": "quantity", "amt": "amount", "num": "number", "no": "number",
+    "addr": "address", "desc": "description", "dt": "date", "ts": "timestamp", "cust": "customer",
+}
+
+DEFINITION_STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "is", "are", "be", "this", "that",
+    "which", "with", "and", "or", "as", "it", "its", "from", "if", "was", "when", "has", "have",
+}
+
+_WORD_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b|_)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokens(text):
+    """Splits a label (snake_case, camelCase, spaced) into normalized lowercase tokens."""
+    result = []
+    for word in _WORD_RE.findall(str(text)):
+        word = word.lower()
+        word = TOKEN_ALIASES.get(word, word)
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        result.append(word)
+    return result
+
+
+def trigrams(label_tokens):
+    text = f" {' '.join(label_tokens)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _feature_bits(feature_sets):
+    """Hashes each item's set of string features into a row of a (n, FEATURE_BITS / 64) uint64 bitset array."""
+    rows, bits = [], []
+    for row, features in enumerate(feature_sets):
+        for feature in features:
+            rows.append(row)
+            bits.append(zlib.crc32(feature.encode()) % FEATURE_BITS)
+    bitsets = np.zeros((len(feature_sets), FEATURE_BITS // 64), dtype=np.uint64)
+    if rows:
+        rows, bits = np.array(rows), np.array(bits, dtype=np.uint64)
+        np.bitwise_or.at(bitsets, (rows, (bits >> np.uint64(6)).astype(np.intp)), np.uint64(1) << (bits & np.uint64(63)))
+    return bitsets
+
+
+def _jaccard(bitsets, left, right):
+    """Jaccard similarity of the bitsets of each (left, right) pair; 0 where both are empty."""
+    a, b = bitsets[left], bitsets[right]
+    intersection = np.bitwise_count(a & b).sum(axis=1, dtype=np.int32)
+    union = np.bitwise_count(a | b).sum(axis=1, dtype=np.int32)
+    return np.divide(intersection, union, out=np.zeros(len(left)), where=union > 0)
+
+
+class FieldTable():
+    """The fields to match, one row each, with their blocking keys and feature bitsets."""
+
+    def __init__(self, index, platforms=None):
+        wanted = {platform.casefold() for platform in platforms} if platforms else None
+        fields = []
+        for prop, types in index.types.items():
+            platform = platform_of(prop)
+            if OWL.DatatypeProperty not in types or platform is None or not index.ranges.get(prop) or not index.labels.get(prop):
+                continue
+            if wanted is not None and platform.casefold() not in wanted:
+                continue
+            # Terms with several labels, definitions or ranges are read in sorted order, not graph order
+            classes = index.property_classes(prop)
+            entity = min(str(label) for label in index.labels[classes[0]]) if classes and index.labels.get(classes[0]) else ""
+            definition = " ".join(sorted({str(definition) for definition in index.defined_by.get(prop, ())}))
+            fields.append((str(prop), platform, min(str(label) for label in index.labels[prop]), entity,
+                           definition, str(min(index.ranges[prop])).replace(XSD_PREFIX, "")))
+        fields.sort()
+        self.uris = [field[0] for field in fields]
+        self.platforms = [field[1] for field in fields]
+        self.labels = [field[2] for field in fields]
+        self.entities = [field[3] for field in fields]
+        self.definitions = [field[4] for field in fields]
+        self.ranges = [field[5] for field in fields]
+
+        platform_codes = {platform: code for code, platform in enumerate(sorted(set(self.platforms)))}
+        self.platform_codes = np.array([platform_codes[platform] for platform in self.platforms], dtype=np.int32)
+        range_names = sorted(set(self.ranges))
+        range_codes = {name: code for code, name in enumerate(range_names)}
+        self.range_codes = np.array([range_codes[name] for name in self.ranges], dtype=np.int32)
+        # Range compatibility: identical, both numeric, one side a string (ids are often typed either way), other
+        self.range_scores = np.array([[1.0 if a == b else 0.8 if a in NUMERIC_RANGES and b in NUMERIC_RANGES
+                                       else 0.5 if "string" in (a, b) else 0.0 for b in range_names] for a in range_names])
+
+        self.label_tokens = [tokens(label) for label in self.labels]
+        self.label_grams = [trigrams(label_tokens) for label_tokens in self.label_tokens]
+        entity_tokens = [set(tokens(entity)) for entity in self.entities]
+        definition_tokens = [{word for word in tokens(definition) if word not in DEFINITION_STOPWORDS} for definition in self.definitions]
+        self.has_definition = np.array([bool(words) for words in definition_tokens])
+
+        self.label_bits = _feature_bits([grams | set(label_tokens) for grams, label_tokens in zip(self.label_grams, self.label_tokens)])
+        self.entity_bits = _feature_bits(entity_tokens)
+        self.definition_bits = _feature_bits(definition_tokens)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def _block_pairs(self, blocks, max_block):
+        """Encoded cross-platform pairs (i * n + j, i < j) of every block of at most max_block members."""
+        n = len(self)
+        chunks = []
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > max_block:
+                continue
+            members = np.array(members)
+            left, right = np.triu_indices(len(members), 1)
+            left, right = members[left], members[right]
+            cross = self.platform_codes[left] != self.platform_codes[right]
+            chunks.append(left[cross].astype(np.int64) * n + right[cross])
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    def candidate_pairs(self, max_block=MAX_BLOCK, max_gram_block=MAX_GRAM_BLOCK, min_shared_grams=MIN_SHARED_GRAMS):
+        """
+        Returns (left, right) index arrays of the pairs worth scoring: fields of different platforms
+        that share a label token or the whole label within an entity, or min_shared_grams label trigrams.
+        """
+        token_blocks, gram_blocks = {}, {}
+        for i, (label_tokens, grams, entity) in enumerate(zip(self.label_tokens, self.label_grams, self.entities)):
+            # Members are appended in index order, so each block is sorted
+            for token in set(label_tokens):
+                token_blocks.setdefault(token, []).append(i)
+            for entity_token in set(tokens(entity)):
+                token_blocks.setdefault(f"{'_'.join(label_tokens)}|{entity_token}", []).append(i)
+            for gram in grams:
+                gram_blocks.setdefault(gram, []).append(i)
+
+        token_pairs = np.unique(self._block_pairs(token_blocks, max_block))
+        gram_pairs, shared = np.unique(self._block_pairs(gram_blocks, max_gram_block), return_counts=True)
+        pairs = np.union1d(token_pairs, gram_pairs[shared >= min_shared_grams])
+        n = len(self)
+        return pairs // n, pairs % n
+
+    def score(self, left, right):
+        """Returns the weighted score and the per-feature similarities of each (left, right) pair."""
+        components = {name: np.zeros(len(left)) for name in WEIGHTS}
+        for start in range(0, len(left), SCORE_CHUNK):
+            l, r = left[start:start + SCORE_CHUNK], right[start:start + SCORE_CHUNK]
+            window = slice(start, start + len(l))
+            components["label"][window] = _jaccard(self.label_bits, l, r)
+            components["entity"][window] = _jaccard(self.entity_bits, l, r)
+            components["definition"][window] = _jaccard(self.definition_bits, l, r)
+            components["range"][window] = self.range_scores[self.range_codes[l], self.range_codes[r]]
+
+        both_defined = self.has_definition[left] & self.has_definition[right]
+        total = np.zeros(len(left))
+        weight = np.zeros(len(left))
+        for name, value in WEIGHTS.items():
+            applies = both_defined if name == "definition" else np.ones(len(left), dtype=bool)
+            total += np.where(applies, value * components[name], 0.0)
+            weight += np.where(applies, value, 0.0)
+        return total / weight, components
+
+
+def rank_candidates(table, left, right, scores, min_score, top_k):
+    """
+    Keeps the pairs scoring at least min_score that are among the top_k candidates of either field
+    for the other field's platform. Returns the positions of the kept pairs, best first.
+    """
+    keep = np.flatnonzero(scores >= min_score)
+    if not len(keep):
+        return keep
+    # Each pair once in either direction: (field, other platform, -score) groups and orders the candidates
+    pair = np.concatenate([keep, keep])
+    source = np.concatenate([left[keep], right[keep]])
+    target = np.concatenate([right[keep], left[keep]])
+    order = np.lexsort((-scores[pair], table.platform_codes[target], source))
+    pair, source, target = pair[order], source[order], target[order]
+    group_key = source.astype(np.int64) * (table.platform_codes.max() + 1) + table.platform_codes[target]
+    starts = np.flatnonzero(np.r_[True, group_key[1:] != group_key[:-1]])
+    rank = np.arange(len(pair)) - np.repeat(starts, np.diff(np.r_[starts, len(pair)]))
+    kept = np.unique(pair[rank < top_k])
+    return kept[np.argsort(-scores[kept], kind="stable")]
+
+
+CANDIDATE_COLUMNS = ["score", "label_score", "definition_score", "range_score", "entity_score", "already_linked",
+                     "platform", "entity", "field", "range", "uri",
+                     "other_platform", "other_entity", "other_field", "other_range", "other_uri"]
+
+
+def _write_candidates(rows, output, format):
+    if format == "ttl":
+        # The suggestions as owl:equivalentProperty triples, to review and merge into the ontology
+        g = Graph()
+        g.bind("owl", OWL)
+        for row in rows:
+            g.add((URIRef(row["uri"]), OWL.equivalentProperty, URIRef(row["other_uri"])))
+        g.serialize(destination=output, format="turtle")
+    elif format == "jsonl":
+        with open(output, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    else:
+        with open(output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=CANDIDATE_COLUMNS, delimiter="\t" if format == "tsv" else ",")
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+CANDIDATE_FORMATS = ("csv", "tsv", "jsonl", "ttl")
+
+
+def match_fields(ttl_file, output, platforms=None, min_score=0.6, top_k=3, max_block=MAX_BLOCK, format=None):
+    """
+    Writes ranked owl:equivalentProperty candidates between the fields of different platforms
+    (only among the given platforms, if any) to a CSV, TSV, JSON Lines or Turtle file.
+    Returns the candidate rows, best first.
+    """
+    format = (format or os.path.splitext(output)[1].lstrip(".")).lower()
+    if format not in CANDIDATE_FORMATS:
+        raise ValueError(f"Unsupported output format '{format}'. Choose one of: {', '.join(CANDIDATE_FORMATS)}")
+
+    g = load_graph(ttl_file)
+    index = OntologyIndex(g, is_primary_key_predicate=IS_PRIMARY_KEY, hierarchy=load_hierarchy(ttl_file, g))
+    table = FieldTable(index, platforms)
+    print(f"Matching {len(table)} fields across {len(set(table.platforms))} platform(s)")
+
+    left, right = table.candidate_pairs(max_block)
+    n = len(table)
+    all_pairs = n * (n - 1) // 2
+    print(f"Blocking kept {len(left)} candidate pairs ({len(left) / all_pairs:.2%} of {all_pairs} field pairs)" if all_pairs else "Nothing to match")
+    scores, components = table.score(left, right)
+    ranked = rank_candidates(table, left, right, scores, min_score, top_k)
+
+    linked = {(str(s), str(o)) for s, targets in index.equivalent_properties.items() for o in targets}
+    rows = []
+    for k in ranked:
+        i, j = int(left[k]), int(right[k])
+        rows.append({
+            "score": round(float(scores[k]), 4),
+            "label_score": round(float(components["label"][k]), 4),
+            "definition_score": round(float(components["definition"][k]), 4),
+            "range_score": round(float(components["range"][k]), 4),
+            "entity_score": round(float(components["entity"][k]), 4),
+            "already_linked": (table.uris[i], table.uris[j]) in linked or (table.uris[j], table.uris[i]) in linked,
+            "platform": table.platforms[i], "entity": table.entities[i], "field": table.labels[i],
+            "range": table.ranges[i], "uri": table.uris[i],
+            "other_platform": table.platforms[j], "other_entity": table.entities[j], "other_field": table.labels[j],
+            "other_range": table.ranges[j], "other_uri": table.uris[j],
+        })
+    _write_candidates(rows, output, format)
+    print(f"{len(rows)} candidate equivalences saved to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suggest owl:equivalentProperty links between the fields of different platforms.")
+    parser.add_argument("output", help="candidates file (.csv, .tsv, .jsonl or .ttl)")
+    parser.add_argument("--ontology", default=DEFAULT_ONTOLOGY, help=f"TTL file (default: {DEFAULT_ONTOLOGY})")
+    parser.add_argument("--platforms", nargs="+", help="only match the fields of these platforms")
+    parser.add_argument("--min-score", type=float, default=0.6, help="lowest score to report (default: 0.6)")
+    parser.add_argument("--top-k", type=int, default=3, help="candidates per field and other platform (default: 3)")
+    parser.add_argument("--max-block", type=int, default=MAX_BLOCK, help=f"skip blocking keys shared by more fields than this (default: {MAX_BLOCK})")
+    parser.add_argument("--format", choices=CANDIDATE_FORMATS, help="output format (default: from the file extension)")
+    args = parser.parse_args()
+    match_fields(args.ontology, args.output, args.platforms, args.min_score, args.top_k, args.max_block, args.format)
+
+if __name__ == "__main__":
+    main()
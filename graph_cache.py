@@ -0,0 +1,229 @@
+import hashlib
+import os
+import pickle
+import re
+from array import array
+from rdflib import Graph, URIRef, Literal, BNode
+
+# === On-disk snapshots of parsed ontology graphs ===
+# Parsing the full Turtle file dominates the runtime of onto.py and convert.py.
+# A snapshot stores the parsed triples as an interned term table plus a flat
+# integer triple array, keyed on the SHA-256 of the TTL file contents.
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Per-platform shards: the core (combined#, OWL/RDFS terms, categories) plus one shard per
+# platform namespace, so single-platform runs only materialize what they use
+PLATFORM_SHARDS_VERSION = 1
+PLATFORM_SHARDS_SUFFIX = ".platforms"
+
+# Both 'Platforms/<Name>#' and the older 'Platform/<Name>#' namespaces are in use
+PLATFORM_NAMESPACE_RE = re.compile(r"^https://www\.cohesyve\.com/ontologies/Platforms?/([^#/]+)#")
+
+_URI, _LITERAL, _BNODE = 0, 1, 2
+
+
+def file_digest(path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(ttl_file, suffix=SNAPSHOT_SUFFIX):
+    """Returns the path of a cache file stored next to the given TTL file."""
+    return f"{ttl_file}{suffix}"
+
+
+def read_cache(ttl_file, suffix, version, digest=None):
+    """Loads a pickled cache payload if it was built from the current TTL contents, else None."""
+    path = cache_path(ttl_file, suffix)
+    if not os.path.isfile(path):
+        return None
+    digest = digest or file_digest(ttl_file)
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable cache '{path}': {e}")
+        return None
+    if not isinstance(payload, dict) or payload.get("version") != version or payload.get("sha256") != digest:
+        return None
+    return payload
+
+
+def write_cache(ttl_file, suffix, version, payload, digest=None):
+    """Pickles a cache payload next to the TTL file, tagged with the TTL's content hash."""
+    path = cache_path(ttl_file, suffix)
+    payload = dict(payload, version=version, sha256=digest or file_digest(ttl_file))
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not write cache '{path}': {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    return path
+
+
+def _encode_term(term):
+    if isinstance(term, URIRef):
+        return (_URI, str(term), None, None)
+    if isinstance(term, Literal):
+        return (_LITERAL, str(term), str(term.datatype) if term.datatype else None, term.language)
+    return (_BNODE, str(term), None, None)
+
+
+def _decode_term(record):
+    kind, value, datatype, lang = record
+    if kind == _URI:
+        return URIRef(value)
+    if kind == _LITERAL:
+        return Literal(value, datatype=URIRef(datatype) if datatype else None, lang=lang)
+    return BNode(value)
+
+
+def graph_to_snapshot(g, triples=None):
+    """Flattens a graph (or a subset of its triples) into an interned term table and an integer triple array."""
+    term_ids = {}
+    terms = []
+    ids = array("I")
+    for triple in (g if triples is None else triples):
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(terms)
+                terms.append(_encode_term(term))
+            ids.append(term_id)
+    return {
+        "namespaces": [(prefix, str(uri)) for prefix, uri in g.namespaces()],
+        "terms": terms,
+        "triples": ids.tobytes(),
+    }
+
+
+def snapshot_to_graph(payload, g=None):
+    """Rebuilds an rdflib Graph from a snapshot payload."""
+    g = Graph() if g is None else g
+    for prefix, uri in payload["namespaces"]:
+        g.bind(prefix, URIRef(uri), override=True, replace=True)
+    terms = [_decode_term(record) for record in payload["terms"]]
+    ids = array("I")
+    ids.frombytes(payload["triples"])
+    g.addN((terms[ids[i]], terms[ids[i + 1]], terms[ids[i + 2]], g) for i in range(0, len(ids), 3))
+    return g
+
+
+def save_snapshot(g, ttl_file, digest=None):
+    """Writes a snapshot of an already-parsed graph for the given TTL file."""
+    return write_cache(ttl_file, SNAPSHOT_SUFFIX, SNAPSHOT_VERSION, graph_to_snapshot(g), digest)
+
+
+def platform_of(term):
+    """Returns the platform name of a term in a platform namespace (e.g. 'Shopify'), else None."""
+    match = PLATFORM_NAMESPACE_RE.match(term) if isinstance(term, URIRef) else None
+    return match.group(1) if match else None
+
+
+def split_by_platform(g):
+    """Splits a graph's triples by subject namespace into core and per-platform shard payloads."""
+    core = []
+    platforms = {}
+    for triple in g:
+        platform = platform_of(triple[0])
+        if platform is None:
+            core.append(triple)
+        else:
+            platforms.setdefault(platform, []).append(triple)
+    return {
+        "core": graph_to_snapshot(g, core),
+        "platforms": {name: graph_to_snapshot(g, triples) for name, triples in platforms.items()},
+    }
+
+
+def save_platform_shards(g, ttl_file, digest=None):
+    """Writes the per-platform shards of an already-parsed graph for the given TTL file."""
+    return write_cache(ttl_file, PLATFORM_SHARDS_SUFFIX, PLATFORM_SHARDS_VERSION, split_by_platform(g), digest)
+
+
+def _select_platforms(available, platforms, onboarding=False):
+    by_key = {name.lower(): name for name in available}
+    selected = []
+    new = []
+    for wanted in platforms:
+        name = by_key.get(str(wanted).lower())
+        if name is None and onboarding:
+            new.append(str(wanted))
+        elif name is None:
+            print(f"Warning: Platform '{wanted}' not found in the ontology. Known platforms: {', '.join(sorted(available))}")
+        elif name not in selected:
+            selected.append(name)
+    if new:
+        print(f"Note: {', '.join(new)} not in the ontology yet; loading only the core for them.")
+    return selected
+
+
+def _load_platform_subset(ttl_file, platforms, graph_class, digest, onboarding=False):
+    shards = read_cache(ttl_file, PLATFORM_SHARDS_SUFFIX, PLATFORM_SHARDS_VERSION, digest)
+    if shards is None:
+        full = _load_full_graph(ttl_file, Graph, digest)
+        shards = split_by_platform(full)
+        write_cache(ttl_file, PLATFORM_SHARDS_SUFFIX, PLATFORM_SHARDS_VERSION, shards, digest)
+
+    g = snapshot_to_graph(shards["core"], graph_class())
+    for name in _select_platforms(shards["platforms"], platforms, onboarding):
+        snapshot_to_graph(shards["platforms"][name], g)
+    return g
+
+
+def _load_full_graph(ttl_file, graph_class, digest):
+    payload = read_cache(ttl_file, SNAPSHOT_SUFFIX, SNAPSHOT_VERSION, digest)
+    if payload is not None:
+        return snapshot_to_graph(payload, graph_class())
+
+    g = graph_class()
+    g.parse(ttl_file, format="turtle")
+    save_snapshot(g, ttl_file, digest)
+    return g
+
+
+def load_graph(ttl_file, use_snapshot=True, graph_class=Graph, platforms=None, onboarding=False):
+    """
+    Loads a Turtle file into a Graph, using the on-disk snapshot when it matches
+    the file's content hash and re-parsing (then refreshing the snapshot) when stale.
+    With platforms (e.g. ["Shopify"]), only the core plus those platform namespaces are loaded.
+    With onboarding, platforms not in the file yet are expected (they are being added) rather than warned about.
+    """
+    if not use_snapshot:
+        g = graph_class()
+        g.parse(ttl_file, format="turtle")
+        return g
+
+    digest = file_digest(ttl_file)
+    if platforms is not None:
+        return _load_platform_subset(ttl_file, platforms, graph_class, digest, onboarding)
+    return _load_full_graph(ttl_file, graph_class, digest)
+
+
+def list_platforms(ttl_file):
+    """Returns the platform namespace names present in a TTL file (from its shards when fresh)."""
+    digest = file_digest(ttl_file)
+    shards = read_cache(ttl_file, PLATFORM_SHARDS_SUFFIX, PLATFORM_SHARDS_VERSION, digest)
+    if shards is None:
+        g = _load_full_graph(ttl_file, Graph, digest)
+        shards = split_by_platform(g)
+        write_cache(ttl_file, PLATFORM_SHARDS_SUFFIX, PLATFORM_SHARDS_VERSION, shards, digest)
+    return sorted(shards["platforms"])
+
+
+def serialize_graph(g, destination, format="turtle", use_snapshot=True):
+    """Serializes a graph and refreshes the snapshot of the written file."""
+    g.serialize(destination=destination, format=format)
+    if use_snapshot and format == "turtle":
+        save_snapshot(g, destination)
@@ -0,0 +1,201 @@
+from array import array
+from bisect import bisect_left
+from rdflib import RDFS, URIRef
+from graph_cache import file_digest, load_graph, read_cache, write_cache
+
+# === Transitive closure of the class and property hierarchies ===
+# Every URI in rdfs:subClassOf / rdfs:subPropertyOf gets an integer id; the ancestors and
+# descendants of each node are stored as sorted id runs in one flat array per direction
+# (offsets[i]:offsets[i + 1] is node i's run), so "all descendants of X" costs O(output)
+# and "is X below Y" a binary search. The tables are cached next to the TTL file.
+
+HIERARCHY_VERSION = 2
+HIERARCHY_SUFFIX = ".hierarchy"
+
+RELATIONS = {
+    "class": RDFS.subClassOf,
+    "property": RDFS.subPropertyOf,
+}
+
+
+def strongly_connected_components(depends_on):
+    """Returns the strongly connected components of the dependency graph (Tarjan's algorithm, iterative)."""
+    index_of, lowlink, on_stack = {}, {}, set()
+    stack, components = [], []
+    for root in sorted(depends_on):
+        if root in index_of:
+            continue
+        work = [(root, iter(sorted(depends_on[root])))]
+        index_of[root] = lowlink[root] = len(index_of)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, parents = work[-1]
+            advanced = False
+            for parent in parents:
+                if parent not in index_of:
+                    index_of[parent] = lowlink[parent] = len(index_of)
+                    stack.append(parent)
+                    on_stack.add(parent)
+                    work.append((parent, iter(sorted(depends_on[parent]))))
+                    advanced = True
+                    break
+                if parent in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[parent])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def _closure(parents_of, size):
+    """
+    Returns (offsets, ids) of every node's ancestors (one or more steps) given each node's direct parents.
+    Cycles are collapsed first: the members of a cycle are each other's ancestors, and share the
+    ancestors of the whole cycle. A node is never listed among its own ancestors.
+    """
+    components = strongly_connected_components({node: parents_of[node] for node in range(size)})
+    component_of = [0] * size
+    for number, component in enumerate(components):
+        for node in component:
+            component_of[node] = number
+
+    # Tarjan emits a component only after every component reachable from it, so one pass over
+    # the condensed DAG sees each component's parents complete
+    reach = []
+    for number, component in enumerate(components):
+        result = set()
+        for node in component:
+            for parent in parents_of[node]:
+                parent_component = component_of[parent]
+                if parent_component != number:
+                    result.update(components[parent_component])
+                    result |= reach[parent_component]
+        reach.append(result)
+
+    offsets = array("I", [0])
+    ids = array("I")
+    for node in range(size):
+        number = component_of[node]
+        ancestors = reach[number] | set(components[number]) if len(components[number]) > 1 else reach[number]
+        ids.extend(sorted(ancestors - {node}))
+        offsets.append(len(ids))
+    return offsets, ids
+
+
+class HierarchyIndex():
+
+    def __init__(self, terms, tables):
+        self.terms = [URIRef(term) for term in terms]
+        self.ids = {term: i for i, term in enumerate(terms)}
+        # tables: relation -> direction ('ancestors' / 'descendants') -> (offsets, ids)
+        self.tables = tables
+
+    @classmethod
+    def from_graph(cls, g):
+        """Builds the closure tables from a graph's subClassOf and subPropertyOf triples."""
+        terms = []
+        ids = {}
+
+        def term_id(term):
+            key = str(term)
+            i = ids.get(key)
+            if i is None:
+                i = ids[key] = len(terms)
+                terms.append(key)
+            return i
+
+        edges = {}
+        for relation, predicate in RELATIONS.items():
+            edges[relation] = [(term_id(child), term_id(parent)) for child, parent in g.subject_objects(predicate)
+                               if isinstance(child, URIRef) and isinstance(parent, URIRef)]
+
+        tables = {}
+        for relation, pairs in edges.items():
+            parents_of = [[] for _ in terms]
+            children_of = [[] for _ in terms]
+            for child, parent in pairs:
+                parents_of[child].append(parent)
+                children_of[parent].append(child)
+            tables[relation] = {
+                "ancestors": _closure(parents_of, len(terms)),
+                "descendants": _closure(children_of, len(terms)),
+            }
+        return cls(terms, tables)
+
+    def to_payload(self):
+        return {
+            "terms": [str(term) for term in self.terms],
+            "tables": {
+                relation: {direction: (offsets.tobytes(), ids.tobytes()) for direction, (offsets, ids) in directions.items()}
+                for relation, directions in self.tables.items()
+            },
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        tables = {}
+        for relation, directions in payload["tables"].items():
+            tables[relation] = {}
+            for direction, (offsets_bytes, ids_bytes) in directions.items():
+                offsets, ids = array("I"), array("I")
+                offsets.frombytes(offsets_bytes)
+                ids.frombytes(ids_bytes)
+                tables[relation][direction] = (offsets, ids)
+        return cls(payload["terms"], tables)
+
+    def _run(self, uri, relation, direction):
+        i = self.ids.get(str(uri))
+        if i is None:
+            return None, 0, 0
+        offsets, ids = self.tables[relation][direction]
+        return ids, offsets[i], offsets[i + 1]
+
+    def descendants(self, uri, relation="property"):
+        """Every URI below uri (one or more rdfs:subPropertyOf / rdfs:subClassOf steps)."""
+        ids, start, end = self._run(uri, relation, "descendants")
+        return [self.terms[ids[k]] for k in range(start, end)]
+
+    def ancestors(self, uri, relation="property"):
+        """Every URI above uri (one or more rdfs:subPropertyOf / rdfs:subClassOf steps)."""
+        ids, start, end = self._run(uri, relation, "ancestors")
+        return [self.terms[ids[k]] for k in range(start, end)]
+
+    def is_descendant(self, uri, ancestor, relation="property"):
+        """True when uri is below ancestor in the hierarchy."""
+        target = self.ids.get(str(uri))
+        ids, start, end = self._run(ancestor, relation, "descendants")
+        if target is None or ids is None:
+            return False
+        k = bisect_left(ids, target, start, end)
+        return k < end and ids[k] == target
+
+
+def save_hierarchy(hierarchy, ttl_file, digest=None):
+    """Writes the closure tables for the given TTL file."""
+    return write_cache(ttl_file, HIERARCHY_SUFFIX, HIERARCHY_VERSION, hierarchy.to_payload(), digest)
+
+
+def load_hierarchy(ttl_file, g=None):
+    """
+    Returns the hierarchy index of a TTL file, from its cache when the file is unchanged.
+    Otherwise it is built from g (which must hold the whole file) or from the loaded file, and cached.
+    """
+    digest = file_digest(ttl_file)
+    payload = read_cache(ttl_file, HIERARCHY_SUFFIX, HIERARCHY_VERSION, digest)
+    if payload is not None:
+        return HierarchyIndex.from_payload(payload)
+    hierarchy = HierarchyIndex.from_graph(g if g is not None else load_graph(ttl_file))
+    save_hierarchy(hierarchy, ttl_file, digest)
+    return hierarchy
@@ -0,0 +1,258 @@
+import argparse
+import datetime
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from rdflib import OWL, URIRef
+from graph_cache import file_digest, load_graph, platform_of, PLATFORM_NAMESPACE_RE
+from ontology_index import OntologyIndex, IS_PRIMARY_KEY, D2C_IS_PRIMARY_KEY
+from hierarchy_index import load_hierarchy
+
+# === Ontology integrity checks ===
+# Finds the mistakes that slip into the merged ontology: legacy primary-key flags, platforms
+# split across the 'Platform/' and 'Platforms/' namespaces, fields without a range, duplicate
+# field labels within an entity, and :query columns the class doesn't define. Triple-level
+# rules run during the single indexing pass; the rest read the indexes built by that pass.
+
+DEFAULT_ONTOLOGY = "D2C Ontology.ttl"
+
+SEVERITIES = ("error", "warning")
+
+# onto.PARTITION_COLUMN: every generated query selects it, but it isn't an ontology field
+IMPLICIT_COLUMNS = {"_time_loaded"}
+
+RULES = {
+    "legacy-primary-key": ("error", "Primary key flagged with D2C#isPrimaryKey; onto.py writes combined#isPrimaryKey."),
+    "split-platform-namespace": ("error", "Platform has terms in both the 'Platform/' and 'Platforms/' namespaces."),
+    "legacy-platform-namespace": ("warning", "Platform uses the older 'Platform/' namespace."),
+    "missing-range": ("error", "Field (a datatype property without sub-properties) has no rdfs:range."),
+    "duplicate-label": ("error", "Several fields of one entity share a label."),
+    "query-unknown-column": ("error", ":query selects columns the class doesn't define."),
+}
+
+
+# === SQL output columns ===
+
+_SQL_TOKEN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|[(),]|\b(?:SELECT|FROM)\b", re.S | re.I)
+_ALIAS = re.compile(r"\bAS\s+(`[^`]+`|\w+)\s*$", re.I)
+_COLUMN_REFERENCE = re.compile(r"^(?:(?:`[^`]+`|\w+)\.)*(`[^`]+`|\w+)$")
+
+
+def query_select_items(sql):
+    """
+    Returns (expression, output column name) for each item of a query's final top-level SELECT (the
+    one after any WITH clauses), or None when they can't be known statically (SELECT *, or nothing parseable).
+    """
+    depth = 0
+    select_start = select_end = None
+    items, item_start = [], None
+    for match in _SQL_TOKEN.finditer(sql):
+        token = match.group()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() == "SELECT":
+            select_start, select_end, items, item_start = match.end(), None, [], match.end()
+        elif depth == 0 and token.upper() == "FROM" and select_start is not None and select_end is None:
+            select_end = match.start()
+            items.append(sql[item_start:select_end])
+        elif depth == 0 and token == "," and select_start is not None and select_end is None:
+            items.append(sql[item_start:match.start()])
+            item_start = match.end()
+    if select_start is None:
+        return None
+    if select_end is None:
+        items.append(sql[item_start:])
+
+    select_items = []
+    for item in items:
+        item = re.sub(r"--[^\n]*", "", item).strip()
+        item = re.sub(r"^(DISTINCT|ALL)\s+", "", item, flags=re.I)
+        if not item:
+            continue  # trailing comma
+        if item == "*" or item.endswith(".*") or re.search(r"\*\s*(EXCEPT|REPLACE)\b", item, re.I):
+            return None
+        match = _ALIAS.search(item) or _COLUMN_REFERENCE.match(item)
+        if match:
+            select_items.append((item[:match.start()].strip() if match.re is _ALIAS else item, match.group(1).strip("`")))
+    return select_items
+
+
+# Columns onboarding's SQL builders emit without a field of the same label:
+# - a flattened object field, `<column>_<key>`, read from '$.<key>' of the object column
+# - a scalar array's item, `<array>_value`, whose field is labelled '<Array>Value'
+_FLATTENED_FIELD = re.compile(r"`([^`]+)`\s*,\s*'\$\.([^'.\[]+)'")
+VALUE_COLUMN_SUFFIX = "_value"
+
+
+def generated_column(expression, column, known):
+    """Whether a column that isn't a field label is one the SQL builders derive from a field (see above)."""
+    match = _FLATTENED_FIELD.search(expression)
+    if match and column == f"{match.group(1)}_{match.group(2)}":
+        return True
+    if column.endswith(VALUE_COLUMN_SUFFIX):
+        return column.replace("_", "").casefold() in known
+    return False
+
+
+# === Checker ===
+
+class IntegrityChecker():
+    """Collects findings for one graph; see check()."""
+
+    def __init__(self, g, hierarchy=None):
+        self.g = g
+        self.hierarchy = hierarchy
+        self.findings = []
+        self.legacy_primary_keys = []
+        self.namespace_use = defaultdict(lambda: defaultdict(int))  # platform -> 'Platform' / 'Platforms' -> term count
+        self.seen_terms = set()
+
+    def add(self, rule, subject, message=None, **details):
+        severity, description = RULES[rule]
+        self.findings.append(dict(rule=rule, severity=severity, subject=str(subject) if subject is not None else None,
+                                  message=message or description, **details))
+
+    # --- Triple-level rules, run during the indexing pass ---
+
+    def observe(self, s, p, o):
+        if p == D2C_IS_PRIMARY_KEY:
+            self.legacy_primary_keys.append(s)
+        for term in (s, o):
+            if isinstance(term, URIRef) and term not in self.seen_terms:
+                self.seen_terms.add(term)
+                match = PLATFORM_NAMESPACE_RE.match(term)
+                if match:
+                    self.namespace_use[match.group(1)]["Platforms" if "/Platforms/" in term else "Platform"] += 1
+
+    # --- Index rules ---
+
+    def check_primary_keys(self, index):
+        for subject in sorted(set(self.legacy_primary_keys)):
+            self.add("legacy-primary-key", subject, flagged_combined=subject in index.primary_keys)
+
+    def check_namespaces(self):
+        for platform, variants in sorted(self.namespace_use.items()):
+            if len(variants) > 1:
+                self.add("split-platform-namespace", None,
+                         f"Platform '{platform}' has {variants['Platform']} term(s) under 'Platform/{platform}#' "
+                         f"and {variants['Platforms']} under 'Platforms/{platform}#'.",
+                         platform=platform, terms=dict(variants))
+            elif "Platform" in variants:
+                self.add("legacy-platform-namespace", None,
+                         f"Platform '{platform}' uses 'Platform/{platform}#'; new platforms use 'Platforms/{platform}#'.",
+                         platform=platform, terms=dict(variants))
+
+    def check_fields(self, index):
+        """Fields without a range, and fields of one entity that share a label."""
+        fields_by_entity = defaultdict(lambda: defaultdict(list))
+        for prop, types in index.types.items():
+            if OWL.DatatypeProperty not in types or platform_of(prop) is None:
+                continue
+            if index.super_property_of.get(prop):
+                continue  # a grouping property (e.g. '<Entity>Property'), not a field
+            if not index.ranges.get(prop):
+                self.add("missing-range", prop, label=str(index.labels[prop][0]) if index.labels.get(prop) else None)
+            for entity in index.property_classes(prop):
+                for label in {str(label).casefold() for label in index.labels.get(prop, ())}:
+                    fields_by_entity[entity][label].append(prop)
+
+        self.fields_by_entity = fields_by_entity
+        for entity, fields in sorted(fields_by_entity.items()):
+            for label, props in sorted(fields.items()):
+                if len(props) > 1:
+                    self.add("duplicate-label", entity,
+                             f"{len(props)} fields of '{index.labels[entity][0] if index.labels.get(entity) else entity}' are labelled '{label}'.",
+                             label=label, properties=sorted(str(prop) for prop in props))
+
+    def check_queries(self, index):
+        """
+        Every output column of a class's :query must be one of the class's field labels, or derived
+        from one the way the SQL builders name flattened object fields and scalar array items.
+        """
+        for cls, queries in sorted(index.queries.items()):
+            if OWL.Class not in index.types.get(cls, ()):
+                continue  # relationship queries select domain_id / range_id, not fields
+            known = set(self.fields_by_entity.get(cls, {})) | IMPLICIT_COLUMNS
+            for sql in queries:
+                select_items = query_select_items(str(sql))
+                if select_items is None:
+                    continue
+                unknown = sorted({column for expression, column in select_items
+                                  if column.casefold() not in known and not generated_column(expression, column, known)})
+                if unknown:
+                    self.add("query-unknown-column", cls,
+                             f"{len(unknown)} column(s) of the :query of '{index.labels[cls][0] if index.labels.get(cls) else cls}' "
+                             f"are not fields of the class: {', '.join(unknown)}.",
+                             columns=unknown)
+
+    def check(self):
+        """Indexes the graph in one pass (running the triple rules on the way), then runs the index rules."""
+        index = OntologyIndex(self.g, is_primary_key_predicate=IS_PRIMARY_KEY, hierarchy=self.hierarchy, on_triple=self.observe)
+        self.seen_terms = set()
+        self.check_primary_keys(index)
+        self.check_namespaces()
+        self.check_fields(index)
+        self.check_queries(index)
+        return self.findings
+
+
+def check_graph(g, hierarchy=None):
+    """Returns the integrity findings for a graph."""
+    return IntegrityChecker(g, hierarchy).check()
+
+
+def summarize(findings):
+    summary = {severity: 0 for severity in SEVERITIES}
+    by_rule = {rule: 0 for rule in RULES}
+    for finding in findings:
+        summary[finding["severity"]] += 1
+        by_rule[finding["rule"]] += 1
+    return dict(summary, rules=by_rule)
+
+
+def check_ontology(ttl_file, report_file=None):
+    """Checks a TTL file and returns the report; with report_file, also writes it as JSON."""
+    start = time.perf_counter()
+    g = load_graph(ttl_file)
+    findings = check_graph(g, load_hierarchy(ttl_file, g))
+    report = {
+        "ontology": ttl_file,
+        "ontology_sha256": file_digest(ttl_file),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "triples": len(g),
+        "seconds": round(time.perf_counter() - start, 3),
+        "summary": summarize(findings),
+        "findings": findings,
+    }
+    if report_file:
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Integrity report saved to {report_file}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an ontology for integrity problems and report them as JSON.")
+    parser.add_argument("ontology", nargs="?", default=DEFAULT_ONTOLOGY, help=f"TTL file (default: {DEFAULT_ONTOLOGY})")
+    parser.add_argument("--output", help="write the JSON report here instead of to stdout")
+    parser.add_argument("--fail-on", choices=SEVERITIES + ("never",), default="error",
+                        help="exit with status 1 when findings of this severity (or worse) exist (default: error)")
+    args = parser.parse_args()
+
+    report = check_ontology(args.ontology, args.output)
+    if not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    summary = report["summary"]
+    print(f"{summary['error']} error(s), {summary['warning']} warning(s) in {report['seconds']}s", file=sys.stderr)
+    if args.fail_on != "never":
+        failing = SEVERITIES[:SEVERITIES.index(args.fail_on) + 1]
+        if any(summary[severity] for severity in failing):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
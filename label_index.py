@@ -0,0 +1,264 @@
+import argparse
+import json
+import time
+from bisect import bisect_left, insort
+from rdflib import RDF, RDFS, OWL, URIRef
+from graph_cache import file_digest, load_graph, read_cache, write_cache, platform_of
+
+# === Inverted index of labels and names ===
+# Maps every normalized rdfs:label and rdfs:isDefinedBy name to the URIs carrying it, with
+# each URI's kind and platform, so lookups by name ("which platforms have a field called
+# sku") are a dictionary hit instead of a graph scan. Keys are kept sorted for prefix search;
+# fuzzy search filters candidates by length and shared bigrams before computing edit distance.
+# The index is cached next to the TTL file.
+
+LABEL_INDEX_VERSION = 1
+LABEL_INDEX_SUFFIX = ".labels"
+
+SOURCES = {
+    "label": RDFS.label,
+    "name": RDFS.isDefinedBy,
+}
+
+# Kind of a term by rdf:type; a term with several types takes the first listed
+KINDS = {
+    "class": OWL.Class,
+    "field": OWL.DatatypeProperty,
+    "relationship": OWL.ObjectProperty,
+    "annotation": OWL.AnnotationProperty,
+}
+
+
+def normalize_label(text):
+    """Case-folded, with runs of whitespace collapsed to one space."""
+    return " ".join(str(text).casefold().split())
+
+
+def _bigrams(key):
+    padded = f"^{key}$"
+    return frozenset(padded[i:i + 2] for i in range(len(padded) - 1))
+
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 once it is known to be larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+class LabelIndex():
+
+    def __init__(self, terms=(), kinds=(), postings=None):
+        self.terms = [URIRef(term) for term in terms]
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.kinds = list(kinds)
+        self.platforms = [platform_of(term) for term in self.terms]
+        # normalized key -> [(term id, source, original text)]
+        self.postings = postings if postings is not None else {}
+        self.keys = sorted(self.postings)
+        # Fuzzy search structures, built on first use: keys by length, and each key's bigrams
+        self._keys_by_length = None
+        self._bigrams = {}
+
+    @classmethod
+    def from_graph(cls, g):
+        index = cls()
+        for kind, type_uri in KINDS.items():
+            for term in sorted(g.subjects(RDF.type, type_uri), key=str):
+                if isinstance(term, URIRef):
+                    index._term_id(term, kind)
+        for source, predicate in SOURCES.items():
+            for term, text in sorted(g.subject_objects(predicate), key=lambda pair: (str(pair[0]), str(pair[1]))):
+                if isinstance(term, URIRef):
+                    index.add(term, text, source)
+        return index
+
+    def to_payload(self):
+        return {"terms": [str(term) for term in self.terms], "kinds": self.kinds, "postings": self.postings}
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(payload["terms"], payload["kinds"], payload["postings"])
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def _term_id(self, term, kind=None):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+            self.kinds.append(kind)
+            self.platforms.append(platform_of(term))
+        elif self.kinds[term_id] is None:
+            self.kinds[term_id] = kind
+        return term_id
+
+    def add(self, term, text, source="label", kind=None):
+        """Indexes one label (or, with source 'name', one rdfs:isDefinedBy name) of a term."""
+        key = normalize_label(text)
+        if not key:
+            return
+        entry = (self._term_id(term, kind), source, str(text))
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = self.postings[key] = []
+            insort(self.keys, key)
+            if self._keys_by_length is not None:
+                self._keys_by_length.setdefault(len(key), []).append(key)
+        if entry not in postings:
+            postings.append(entry)
+
+    def add_terms(self, g, terms):
+        """Indexes the labels, names and kind of terms added to g after the index was built."""
+        for term in terms:
+            types = set(g.objects(term, RDF.type))
+            kind = next((kind for kind, type_uri in KINDS.items() if type_uri in types), None)
+            self._term_id(term, kind)
+            for source, predicate in SOURCES.items():
+                for text in g.objects(term, predicate):
+                    self.add(term, text, source, kind)
+
+    # === Lookups ===
+    # Each returns one record per URI: {"uri", "label", "source", "kind", "platform"}, plus
+    # "distance" for fuzzy search. kind, platform and source narrow the results.
+
+    def _records(self, key, distance=None, kind=None, platform=None, source=None):
+        platform = platform.casefold() if platform is not None else None
+        for term_id, entry_source, text in self.postings.get(key, ()):
+            if kind is not None and self.kinds[term_id] != kind:
+                continue
+            if platform is not None and (self.platforms[term_id] or "").casefold() != platform:
+                continue
+            if source is not None and entry_source != source:
+                continue
+            record = {"uri": str(self.terms[term_id]), "label": text, "source": entry_source,
+                      "kind": self.kinds[term_id], "platform": self.platforms[term_id]}
+            if distance is not None:
+                record["distance"] = distance
+            yield record
+
+    def _collect(self, keys_with_distance, limit, filters):
+        """One record per URI (its closest key, labels before names), ordered by distance, key and URI."""
+        best = {}
+        for key, distance in keys_with_distance:
+            for record in self._records(key, distance, **filters):
+                rank = (distance or 0, key, record["source"] != "label")
+                if record["uri"] not in best or rank < best[record["uri"]][0]:
+                    best[record["uri"]] = (rank, record)
+        records = [record for _, record in sorted(best.values(), key=lambda item: (item[0], item[1]["uri"]))]
+        return records[:limit] if limit is not None else records
+
+    def lookup(self, text, **filters):
+        """Terms whose label or name equals text (ignoring case and spacing)."""
+        return self._collect([(normalize_label(text), None)], None, filters)
+
+    def prefix(self, text, limit=None, **filters):
+        """Terms with a label or name starting with text."""
+        prefix = normalize_label(text)
+        keys = []
+        for i in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            keys.append((self.keys[i], None))
+        return self._collect(keys, limit, filters)
+
+    def fuzzy(self, text, max_distance=2, limit=None, **filters):
+        """Terms with a label or name within max_distance edits of text, closest first."""
+        query = normalize_label(text)
+        if self._keys_by_length is None:
+            keys_by_length = {}
+            for key in self.keys:
+                keys_by_length.setdefault(len(key), []).append(key)
+            self._keys_by_length = keys_by_length
+        query_bigrams = _bigrams(query)
+        # Each edit changes at most two bigrams, so a match shares all but 2 * max_distance of the query's
+        min_shared = len(query_bigrams) - 2 * max_distance
+        keys = []
+        for length in range(max(1, len(query) - max_distance), len(query) + max_distance + 1):
+            for key in self._keys_by_length.get(length, ()):
+                if min_shared > 0:
+                    key_bigrams = self._bigrams.get(key)
+                    if key_bigrams is None:
+                        key_bigrams = self._bigrams[key] = _bigrams(key)
+                    if len(query_bigrams & key_bigrams) < min_shared:
+                        continue
+                distance = edit_distance(query, key, max_distance)
+                if distance <= max_distance:
+                    keys.append((key, distance))
+        return self._collect(keys, limit, filters)
+
+    def platforms_with(self, text, kind="field"):
+        """The platforms with a term of this kind labelled or named text."""
+        return sorted({record["platform"] for record in self.lookup(text, kind=kind) if record["platform"]})
+
+    def platform_terms(self, platform):
+        """Every indexed term in a platform's namespace."""
+        platform = platform.casefold()
+        return [term for term, term_platform in zip(self.terms, self.platforms)
+                if term_platform is not None and term_platform.casefold() == platform]
+
+
+def save_label_index(index, ttl_file, digest=None):
+    """Writes the label index for the given TTL file."""
+    return write_cache(ttl_file, LABEL_INDEX_SUFFIX, LABEL_INDEX_VERSION, index.to_payload(), digest)
+
+
+def load_label_index(ttl_file, g=None):
+    """
+    Returns the label index of a TTL file, from its cache when the file is unchanged.
+    Otherwise it is built from g (which must hold the whole file) or from the loaded file, and cached.
+    """
+    digest = file_digest(ttl_file)
+    payload = read_cache(ttl_file, LABEL_INDEX_SUFFIX, LABEL_INDEX_VERSION, digest)
+    if payload is not None:
+        return LabelIndex.from_payload(payload)
+    index = LabelIndex.from_graph(g if g is not None else load_graph(ttl_file))
+    save_label_index(index, ttl_file, digest)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up ontology terms by label or rdfs:isDefinedBy name.")
+    parser.add_argument("text", help="label or name to look up")
+    parser.add_argument("--ontology", default="D2C Ontology.ttl", help="TTL file (default: D2C Ontology.ttl)")
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument("--prefix", action="store_true", help="match labels and names starting with the text")
+    search.add_argument("--fuzzy", type=int, metavar="DISTANCE", help="match labels and names within DISTANCE edits")
+    search.add_argument("--platforms", action="store_true", help="only list the platforms with a term of --kind (default: field) by this name")
+    parser.add_argument("--kind", choices=sorted(KINDS), help="only terms of this kind")
+    parser.add_argument("--platform", help="only terms of this platform")
+    parser.add_argument("--limit", type=int, help="at most this many results")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_label_index(args.ontology)
+    loaded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if args.platforms:
+        results = index.platforms_with(args.text, args.kind or "field")
+    else:
+        filters = {"kind": args.kind, "platform": args.platform}
+        if args.prefix:
+            results = index.prefix(args.text, args.limit, **filters)
+        elif args.fuzzy is not None:
+            results = index.fuzzy(args.text, args.fuzzy, args.limit, **filters)
+        else:
+            results = index.lookup(args.text, **filters)[:args.limit]
+    searched = time.perf_counter() - start
+
+    for result in results:
+        print(json.dumps(result))
+    print(f"{len(results)} result(s); index loaded in {loaded * 1000:.1f} ms, searched in {searched * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+from graph_cache import file_digest, load_graph, platform_of
+from ontology_index import OntologyIndex, IS_PRIMARY_KEY
+from hierarchy_index import load_hierarchy
+from label_index import load_label_index
+from convert import query_dependencies
+
+# === Long-lived lookup service over the ontology ===
+# Pipelines that only need "the queries of platform X", "the fields of entity Y", "the
+# foreign keys of class Z" or "the platforms with a field called W" shouldn't parse the TTL file in a fresh process every time.
+# The service loads the graph once, precomputes those answers into plain dicts, serves
+# them as JSON over HTTP (TCP or a Unix socket) and reloads when the TTL file changes.
+
+DEFAULT_ONTOLOGY = "D2C Ontology.ttl"
+DEFAULT_PORT = 8765
+
+# Encoded responses kept per lookup version; query strings are free text, so the cache is bounded
+RESPONSE_CACHE_SIZE = 4096
+
+XSD_PREFIX = "http://www.w3.org/2001/XMLSchema#"
+
+# Label search modes of OntologyLookup.labels
+LABEL_MATCHES = ("exact", "prefix", "fuzzy")
+
+
+def _label(index, term):
+    labels = index.labels.get(term)
+    return str(labels[0]) if labels else None
+
+
+class OntologyLookup():
+    """
+    Precomputed answers for one version of the TTL file. Lookups by name are case-insensitive.
+    It has the same lookup methods as LookupClient, so it also stands in for the service in-process.
+    """
+
+    def __init__(self, ttl_file):
+        self.ttl_file = ttl_file
+        self.digest = file_digest(ttl_file)
+        self.loaded = datetime.datetime.now().isoformat(timespec="seconds")
+        start = time.perf_counter()
+
+        g = load_graph(ttl_file)
+        hierarchy = load_hierarchy(ttl_file, g)
+        # The ontology flags primary keys in the combined namespace (as onto.py writes them)
+        index = OntologyIndex(g, is_primary_key_predicate=IS_PRIMARY_KEY, hierarchy=hierarchy)
+        self.triples = len(g)
+        self.label_index = load_label_index(ttl_file, g)
+
+        # === Queries by platform ===
+        depends_on, foreign_keys = query_dependencies(index)
+        self._queries = {}
+        for cls, queries in index.queries.items():
+            platform = platform_of(cls) or "core"
+            self._queries.setdefault(platform.casefold(), []).append({
+                "class": str(cls),
+                "label": _label(index, cls),
+                "platform": platform,
+                "sql": sorted(str(q) for q in queries)[0],
+                "depends_on": sorted(str(parent) for parent in depends_on.get(cls, ())),
+            })
+        for records in self._queries.values():
+            records.sort(key=lambda record: (str(record["label"]), record["class"]))
+
+        # === Foreign keys by class, both directions ===
+        links = {}
+
+        def link_record(cls):
+            record = links.get(cls)
+            if record is None:
+                record = links[cls] = {"class": str(cls), "label": _label(index, cls), "platform": platform_of(cls),
+                                       "references": [], "referenced_by": []}
+            return record
+
+        for cls, keys in foreign_keys.items():
+            link_record(cls)
+            for column, key_cls, key_column in keys:
+                link_record(cls)["references"].append({"column": column, "class": str(key_cls), "referenced_column": key_column})
+                link_record(key_cls)["referenced_by"].append({"column": column, "class": str(cls), "referenced_column": key_column})
+        self._links = {}
+        for cls, record in links.items():
+            for direction in ("references", "referenced_by"):
+                record[direction].sort(key=lambda link: (str(link["column"]), link["class"], str(link["referenced_column"])))
+            self._links[str(cls)] = [record]
+            if record["label"]:
+                self._links.setdefault(record["label"].casefold(), []).append(record)
+        for records in self._links.values():
+            records.sort(key=lambda record: record["class"])
+
+        # === Fields by entity ===
+        self._entities = {}
+        self._entity_names = {}
+        for parent_class, parent_label, sub_class, sub_label, _ in index.platform_field_classes():
+            platform = platform_of(sub_class) or str(parent_label).replace("PlatformField", "")
+            fields = {}
+            for _, _, name, definition, range_uri, is_primary_key in index.class_properties(parent_class, sub_class):
+                fields[(str(name), str(definition), str(range_uri), is_primary_key)] = None
+            self._entities.setdefault(str(sub_label).casefold(), []).append({
+                "class": str(sub_class),
+                "entity": str(sub_label),
+                "platform": platform,
+                "fields": [
+                    {"name": name, "definition": definition, "type": range_uri.replace(XSD_PREFIX, ""), "is_primary_key": bool(is_primary_key)}
+                    for name, definition, range_uri, is_primary_key in fields
+                ],
+            })
+            self._entity_names.setdefault(platform.casefold(), set()).add(str(sub_label))
+        for records in self._entities.values():
+            records.sort(key=lambda record: (record["platform"], record["class"]))
+
+        self._platforms = sorted({record["platform"] for records in self._queries.values() for record in records}
+                                 | {record["platform"] for records in self._entities.values() for record in records})
+        self.build_seconds = round(time.perf_counter() - start, 3)
+
+    def info(self):
+        return {"ontology": self.ttl_file, "sha256": self.digest, "loaded": self.loaded,
+                "build_seconds": self.build_seconds, "triples": self.triples, "platforms": len(self._platforms)}
+
+    def platforms(self):
+        return list(self._platforms)
+
+    def entities(self, platform):
+        """The entity labels of a platform."""
+        return sorted(self._entity_names.get(platform.casefold(), ()))
+
+    def queries(self, platform):
+        """The query classes of a platform ('core' for classes outside the platform namespaces) with their SQL."""
+        return self._queries.get(platform.casefold(), [])
+
+    def fields(self, entity, platform=None):
+        """Every entity with this label (only the given platform's, if any), with its fields."""
+        records = self._entities.get(entity.casefold(), [])
+        if platform is not None:
+            records = [record for record in records if record["platform"].casefold() == platform.casefold()]
+        return records
+
+    def foreign_keys(self, cls):
+        """The foreign keys from and to a query class, given by URI or label."""
+        return self._links.get(cls) or self._links.get(cls.casefold(), [])
+
+    def labels(self, name, match=None, kind=None, platform=None):
+        """Terms labelled or named name: 'exact' (default), 'prefix' or 'fuzzy' (within two edits)."""
+        match = match or "exact"
+        if match not in LABEL_MATCHES:
+            raise ValueError(f"Unknown match '{match}'; use one of {', '.join(LABEL_MATCHES)}")
+        search = {"exact": self.label_index.lookup, "prefix": self.label_index.prefix, "fuzzy": self.label_index.fuzzy}[match]
+        return search(name, kind=kind, platform=platform)
+
+    def platforms_with(self, name, kind=None):
+        """The platforms with a term of this kind (default: field) labelled or named name."""
+        return self.label_index.platforms_with(name, kind or "field")
+
+
+# === HTTP service ===
+
+# path -> (method name, required parameters, optional parameters)
+ENDPOINTS = {
+    "/info": ("info", (), ()),
+    "/platforms": ("platforms", (), ()),
+    "/entities": ("entities", ("platform",), ()),
+    "/queries": ("queries", ("platform",), ()),
+    "/fields": ("fields", ("entity",), ("platform",)),
+    "/foreign-keys": ("foreign_keys", ("class",), ()),
+    "/labels": ("labels", ("name",), ("match", "kind", "platform")),
+    "/platforms-with": ("platforms_with", ("name",), ("kind",)),
+}
+
+
+class ResponseCache():
+    """Least recently used encoded response bodies, at most `size` of them."""
+
+    def __init__(self, size=RESPONSE_CACHE_SIZE):
+        self.size = size
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            if len(self._bodies) > self.size:
+                self._bodies.popitem(last=False)
+
+    def __len__(self):
+        return len(self._bodies)
+
+
+class LookupService():
+    """Holds the current OntologyLookup and swaps in a new one when the TTL file's contents change."""
+
+    def __init__(self, ttl_file, poll_interval=2.0, cache_size=RESPONSE_CACHE_SIZE):
+        self.ttl_file = ttl_file
+        self.poll_interval = poll_interval
+        self.cache_size = cache_size
+        self._file_state = self._stat()
+        # The lookup and its encoded responses are swapped together, as one tuple
+        self._current = (OntologyLookup(ttl_file), ResponseCache(cache_size))
+        self._stopped = threading.Event()
+
+    @property
+    def lookup(self):
+        return self._current[0]
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.ttl_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self):
+        """Rebuilds the lookup when the file changed; requests keep using the old one until the new one is ready."""
+        state = self._stat()
+        if state is None or state == self._file_state:
+            return False
+        self._file_state = state
+        try:
+            if file_digest(self.ttl_file) == self.lookup.digest:
+                return False
+            lookup = OntologyLookup(self.ttl_file)
+        except Exception as e:  # a half-written file is retried when it next changes
+            print(f"Warning: Could not reload '{self.ttl_file}', still serving the previous version: {e}")
+            return False
+        self._current = (lookup, ResponseCache(self.cache_size))
+        print(f"Reloaded {self.ttl_file} ({lookup.triples} triples, sha256 {lookup.digest[:12]}) in {lookup.build_seconds}s")
+        return True
+
+    def watch(self):
+        """Polls the TTL file in a daemon thread."""
+        def poll():
+            while not self._stopped.wait(self.poll_interval):
+                self.reload_if_changed()
+        thread = threading.Thread(target=poll, name="ontology-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopped.set()
+
+    def response(self, path, params):
+        """Returns (status, JSON body bytes) for a request. Recently used bodies are cached per lookup version."""
+        endpoint = ENDPOINTS.get(path)
+        if endpoint is None:
+            return 404, json.dumps({"error": f"Unknown path '{path}'", "paths": sorted(ENDPOINTS)}).encode()
+        method, required, optional = endpoint
+        missing = [name for name in required if not params.get(name)]
+        if missing:
+            return 400, json.dumps({"error": f"Missing parameter(s): {', '.join(missing)}"}).encode()
+        args = tuple(params[name] for name in required) + tuple(params.get(name) for name in optional)
+        lookup, responses = self._current
+        if method == "info":
+            return 200, json.dumps(lookup.info()).encode()
+        key = (method, args)
+        body = responses.get(key)
+        if body is None:
+            try:
+                body = json.dumps(getattr(lookup, method)(*args)).encode()
+            except ValueError as e:
+                return 400, json.dumps({"error": str(e)}).encode()
+            responses.put(key, body)
+        return 200, body
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients reuse one connection
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        status, body = self.server.service.response(url.path, params)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class TCPLookupRequestHandler(LookupRequestHandler):
+
+    # Headers and body are separate writes; with Nagle's algorithm on, each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None, verbose=False):
+    """An HTTP server for the service on host:port, or on a Unix socket when socket_path is given."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # left over from a previous run
+        server = ThreadingUnixHTTPServer(socket_path, LookupRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), TCPLookupRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def serve(ttl_file, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None, poll_interval=2.0, verbose=False):
+    service = LookupService(ttl_file, poll_interval)
+    print(f"Loaded {ttl_file} ({service.lookup.triples} triples) in {service.lookup.build_seconds}s")
+    server = make_server(service, host, port, socket_path, verbose)
+    if poll_interval > 0:
+        service.watch()
+    print(f"Serving lookups on {socket_path or f'http://{host}:{server.server_address[1]}'} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# === Client ===
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=10):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class LookupClient():
+    """
+    Client for the lookup service, at 'http://host:port' or a Unix socket path. It keeps one
+    connection open, so use one client per thread. Lookups return what OntologyLookup returns.
+    """
+
+    def __init__(self, address, timeout=10):
+        self.address = address
+        if address.startswith("http://"):
+            url = urlsplit(address)
+            self.connection = http.client.HTTPConnection(url.hostname, url.port or DEFAULT_PORT, timeout=timeout)
+        else:
+            self.connection = UnixHTTPConnection(address, timeout)
+
+    def _get(self, path, **params):
+        query = urlencode({name: value for name, value in params.items() if value is not None})
+        target = f"{path}?{query}" if query else path
+        for attempt in (1, 2):
+            try:
+                self.connection.request("GET", target)
+                response = self.connection.getresponse()
+                body = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.connection.close()
+                if attempt == 2:
+                    raise
+        if response.status != 200:
+            raise LookupError(f"{target}: HTTP {response.status}: {json.loads(body).get('error')}")
+        return json.loads(body)
+
+    def info(self):
+        return self._get("/info")
+
+    def platforms(self):
+        return self._get("/platforms")
+
+    def entities(self, platform):
+        return self._get("/entities", platform=platform)
+
+    def queries(self, platform):
+        return self._get("/queries", platform=platform)
+
+    def fields(self, entity, platform=None):
+        return self._get("/fields", entity=entity, platform=platform)
+
+    def foreign_keys(self, cls):
+        return self._get("/foreign-keys", **{"class": cls})
+
+    def labels(self, name, match=None, kind=None, platform=None):
+        return self._get("/labels", name=name, match=match, kind=kind, platform=platform)
+
+    def platforms_with(self, name, kind=None):
+        return self._get("/platforms-with", name=name, kind=kind)
+
+    def close(self):
+        self.connection.close()
+
+
+# === Throughput benchmark ===
+
+def lookup_mix(lookup, count, seed=0):
+    """A reproducible mix of `count` lookups (method name, args) over the ontology's platforms, entities and query classes."""
+    candidates = []
+    for platform in lookup.platforms():
+        candidates.append(("queries", (platform,)))
+        for record in lookup.queries(platform):
+            if record["label"]:
+                candidates.append(("foreign_keys", (record["label"],)))
+        for entity in lookup.entities(platform):
+            candidates.append(("fields", (entity, platform)))
+    rng = random.Random(seed)
+    return [rng.choice(candidates) for _ in range(count)]
+
+
+def benchmark(make_lookup, requests=5000, clients=4):
+    """
+    Runs a lookup mix from `clients` threads, each with its own make_lookup() (a LookupClient, or
+    a shared OntologyLookup for the in-process baseline), and returns throughput and latency percentiles.
+    """
+    probe = make_lookup()
+    mix = lookup_mix(probe, requests)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(calls):
+        lookup = make_lookup()
+        timings = []
+        for method, args in calls:
+            start = time.perf_counter()
+            getattr(lookup, method)(*args)
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    threads = [threading.Thread(target=worker, args=(mix[i::clients],)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "clients": clients,
+        "seconds": round(seconds, 4),
+        "requests_per_sec": round(len(latencies) / seconds, 1) if seconds > 0 else None,
+        "latency_ms": {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99), "max": percentile(100)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ontology lookups from memory, or benchmark the service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the lookup service")
+    serve_parser.add_argument("--ontology", default=DEFAULT_ONTOLOGY, help=f"TTL file to serve (default: {DEFAULT_ONTOLOGY})")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    serve_parser.add_argument("--socket", help="listen on this Unix socket path instead of TCP")
+    serve_parser.add_argument("--poll", type=float, default=2.0, help="seconds between TTL change checks; 0 disables reloading (default: 2)")
+    serve_parser.add_argument("--verbose", action="store_true", help="log every request")
+
+    bench_parser = commands.add_parser("bench", help="measure lookup throughput against a running service")
+    bench_parser.add_argument("--address", default=f"http://127.0.0.1:{DEFAULT_PORT}", help="service URL or Unix socket path")
+    bench_parser.add_argument("--local", metavar="TTL", help="benchmark an in-process OntologyLookup of this file instead")
+    bench_parser.add_argument("--requests", type=int, default=5000, help="number of lookups (default: 5000)")
+    bench_parser.add_argument("--clients", type=int, default=4, help="concurrent client threads (default: 4)")
+    bench_parser.add_argument("--output", help="also save the results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.ontology, args.host, args.port, args.socket, args.poll, args.verbose)
+        return
+
+    if args.local:
+        start = time.perf_counter()
+        local = OntologyLookup(args.local)
+        print(f"Built in-process lookup in {time.perf_counter() - start:.3f}s")
+        result = dict(target=f"in-process:{args.local}", **benchmark(lambda: local, args.requests, args.clients))
+    else:
+        result = dict(target=args.address, **benchmark(lambda: LookupClient(args.address), args.requests, args.clients))
+    print(f"{result['requests']} lookups from {result['clients']} client(s) in {result['seconds']}s: "
+          f"{result['requests_per_sec']} lookups/s, latency p50 {result['latency_ms']['p50']} ms, "
+          f"p95 {result['latency_ms']['p95']} ms, p99 {result['latency_ms']['p99']} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Benchmark results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
-import json,random,string
+import json
 from rdflib import Graph, Namespace, RDF, RDFS, OWL, XSD, Literal
 import argparse
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from rdflib import URIRef
+from graph_cache import load_graph, serialize_graph, platform_of
+from delta import JournalGraph, write_delta, DELTA_FORMATS
+from uri_allocator import SlugAllocator
+from hierarchy_index import load_hierarchy
+from label_index import load_label_index
+from compact_store import CompactStore
+from profiling import Profiler, NULL_PROFILER
+from catalog_schema import normalize_stream
+from catalog_reader import iter_catalog_streams, is_selected
+from integrity_check import check_graph, summarize
 
 # === Define shared 'has_field' superproperty ===
 # has_field = PlatformPrefix.has_field
@@ -20,9 +32,27 @@ type_map = {
 # Reverse map for finding string representation from XSD URI
 xsd_to_str_map = {v: k for k, v in type_map.items()}
 
+# === Warehouse layout of the tap tables ===
+# Tap tables are partitioned by day on _time_loaded and clustered by the stream's key properties
+PARTITION_COLUMN = "_time_loaded"
+PARTITION_GRANULARITY = "DAY"
+
+# === JSON handling in generated queries ===
+# "extract": one JSON_EXTRACT_SCALAR per field, every value as STRING (original behaviour)
+# "parse": each JSON column is parsed once per row and fields are cast to their XSD-mapped type
+JSON_MODES = ("extract", "parse")
+
+# BigQuery type for each XSD range in type_map
+bigquery_type_map = {
+    XSD.string: "STRING",
+    XSD.integer: "INT64",
+    XSD.boolean: "BOOL",
+    XSD.decimal: "NUMERIC"
+}
+
 class Ontology():
 
-    def __init__(self, existing_ontology_file, catalog_file, output_ontology_file, platform, tap):
+    def __init__(self, existing_ontology_file, catalog_file, output_ontology_file, platform, tap, parent_category=None, graph=None, update=False, key_window=False, json_mode="extract", label_index=None, slugs=None):
         self.EXISTING_TTL = existing_ontology_file
         self.SCHEMA_JSON = catalog_file
         self.OUTPUT_TTL = output_ontology_file
@@ -32,9 +62,18 @@ class Ontology():
 
         self.PLATFORM_URI = f"https://www.cohesyve.com/ontologies/Platforms/{self.PLATFORM}#"
 
+        # Also bound queries to the stream's replication key window, when it has one
+        self.key_window = key_window
+        self.window_keys = {}
+        self.json_mode = json_mode
+
         # === Load Ontology & JSON ===
-        self.g = Graph()
-        self.g.parse(self.EXISTING_TTL, format="turtle")
+        # A batch run passes in the already-loaded graph so the base ontology is parsed once
+        if graph is not None:
+            self.g = graph
+        else:
+            # Reuses the on-disk snapshot of the parsed graph when the TTL is unchanged
+            self.g = load_graph(self.EXISTING_TTL)
 
         # === Define Namespace for New Platform ===
         self.BasePrefix = Namespace("https://www.cohesyve.com/ontologies/combined#")
@@ -42,61 +81,56 @@ class Ontology():
         self.g.bind("", self.BasePrefix)
         self.g.bind(self.PLATFORM_PREFIX, self.PlatformPrefix)
 
-        # === Find Subclasses of a Specific Class ===
-        # Import URIRef if not already imported at the top
+        # (parent datatype property URI, field name) -> (property URI, XSD range), filled by create_subproperty
+        self.property_registry = {}
+        self.hierarchy = None
+        self.profiler = NULL_PROFILER
+
+        # Labels and names of the base ontology (a batch run shares one index); URIs minted in this run
+        self.label_index = label_index
+        self.minted = []
+
+        # Slugs are derived from each entity's label and links, checked against every slug in the graph
+        # (a batch run shares one allocator, which already holds the slugs of earlier entries)
+        self.slugs = slugs if slugs is not None else SlugAllocator.from_graph(self.g)
+
+        # === Update mode: reuse this platform's existing classes and properties ===
+        self.update = update
+        self.touched = set()
+        self.existing_labels = {}
+        self.existing_entities = set()
+        self.regenerated_queries = 0
+        existing_platform_class_uri = self.find_existing_platform() if update else None
+        if existing_platform_class_uri is not None:
+            self.index_existing_platform()
+            self.touched.add(existing_platform_class_uri)
+            self.new_platform_class_uri = existing_platform_class_uri
+            self.selected_parent_platform_class_uri = self.g.value(existing_platform_class_uri, RDFS.subClassOf)
+            print(f"Updating existing platform {self.PLATFORM} <{existing_platform_class_uri}> ({len(self.existing_entities)} classes and properties)")
+            return
+        elif update:
+            print(f"Platform {self.PLATFORM} is not in the ontology yet; onboarding it from scratch.")
 
+        # === Find Subclasses of a Specific Class ===
         # Define the target class URI
-        target_class_uri = URIRef("https://www.cohesyve.com/ontologies/combined#maduz-holot-kogit-sojal")
+        self.target_class_uri = URIRef("https://www.cohesyve.com/ontologies/combined#maduz-holot-kogit-sojal")
 
         # Find resources that are subclasses of the target class
-        subclasses = list(self.g.subjects(predicate=RDFS.subClassOf, object=target_class_uri))
+        subclasses = list(self.g.subjects(predicate=RDFS.subClassOf, object=self.target_class_uri))
 
-        # === Ask user to choose a subclass ===
+        # === Choose the parent category (from the argument, or ask the user) ===
         self.selected_parent_platform_class_uri = None
-        if subclasses:
-            print("Found the following platform categories:")
-            for i, subclass in enumerate(subclasses):
-            # Attempt to get a label for better display, fallback to URI fragment
-                label = self.g.value(subclass, RDFS.label)
-                if not label:
-                    label = subclass.split('#')[-1] if '#' in subclass else subclass.split('/')[-1]
-                    
-                print(f"  {i + 1}: {label}")
-
-            print(f"  {len(subclasses) + 1}: Create a new category")
-
-            while self.selected_parent_platform_class_uri is None:
-                try:
-                    choice = input("Enter the number of the category you want to add this platform to: ")
-                    choice_index = int(choice) - 1
-
-                    # Use the new platform prefix with the random slug
-                    random_id = self.random_slug()
-                    self.new_platform_class_uri = self.PlatformPrefix[random_id]
-                
-                    if 0 <= choice_index < len(subclasses):
-                        self.selected_parent_platform_class_uri = subclasses[choice_index]
-                        print(f"Using {self.g.value(self.selected_parent_platform_class_uri, RDFS.label) or self.selected_parent_platform_class_uri} as the parent class.")
-                        break
-                    elif choice_index == len(subclasses):
-                        # Create a new category
-                        new_category_name = input("\nEnter the name for the new category: ")
-                        new_category_uri = self.BasePrefix[self.random_slug()]
-                        self.g.add((new_category_uri, RDF.type, OWL.Class))
-                        self.g.add((new_category_uri, RDFS.label, Literal(new_category_name + "Platform", lang="en")))
-                        self.g.add((new_category_uri, RDFS.subClassOf, target_class_uri))
-                        print(f"Created new category: {new_category_name} with URI: {new_category_uri}")
-                        self.selected_parent_platform_class_uri = new_category_uri
-                        break
-                    else:
-                        print("Invalid number. Please choose from the list.")
-                except ValueError:
-                    print("Invalid input. Please enter a number.")
-            else:
-                print(f"No subclasses found for {target_class_uri}. Cannot proceed with subclass selection.")
-                # Handle this case as needed, e.g., exit or use a default
-                # For now, self.parent_class_uri remains None
-            
+        if parent_category is not None:
+            self.selected_parent_platform_class_uri = self.resolve_parent_category(parent_category, subclasses)
+        elif subclasses:
+            self.selected_parent_platform_class_uri = self.choose_parent_category(subclasses)
+        else:
+            print(f"No subclasses found for {self.target_class_uri}. Cannot proceed with subclass selection.")
+            # Handle this case as needed, e.g., exit or use a default
+            # For now, self.parent_class_uri remains None
+
+        if self.selected_parent_platform_class_uri is not None:
+            self.new_platform_class_uri = self.mint(Literal(f"{self.PLATFORM}", lang="en"), (RDFS.subClassOf, self.selected_parent_platform_class_uri))
             print(f"Creating new platform class URI: {self.new_platform_class_uri}")
 
             # Add the new platform class as a subclass of the selected parent
@@ -105,29 +139,291 @@ class Ontology():
             self.g.add((self.new_platform_class_uri, RDFS.label, Literal(f"{self.PLATFORM}", lang="en")))
 
             print(f"Added {self.new_platform_class_uri} as a subclass of {self.selected_parent_platform_class_uri}")
-    
+
+    @classmethod
+    def fragment(cls, platform, tap, main_class_uri, main_property_uri, main_relationship_uri, key_window=False, json_mode="extract"):
+        """
+        Creates an Ontology that writes into a fresh, empty graph, wired to the platform's
+        main class and properties. Used by process-pool workers to build one stream each.
+        """
+        self = cls.__new__(cls)
+        self.EXISTING_TTL = self.SCHEMA_JSON = self.OUTPUT_TTL = None
+        self.PLATFORM = platform
+        self.PLATFORM_PREFIX = self.PLATFORM.lower()
+        self.TAP = tap
+        self.PLATFORM_URI = f"https://www.cohesyve.com/ontologies/Platforms/{self.PLATFORM}#"
+        self.key_window = key_window
+        self.window_keys = {}
+        self.json_mode = json_mode
+        self.BasePrefix = Namespace("https://www.cohesyve.com/ontologies/combined#")
+        self.PlatformPrefix = Namespace(self.PLATFORM_URI)
+        self.g = Graph()
+        self.property_registry = {}
+        self.hierarchy = None
+        self.profiler = NULL_PROFILER
+        self.label_index = None
+        self.minted = []
+        self.slugs = SlugAllocator()
+        self.update = False
+        self.main_class_uri = main_class_uri
+        self.main_property_uri = main_property_uri
+        self.main_relationship_uri = main_relationship_uri
+        return self
+
+    def find_existing_platform(self):
+        """Returns the class of this platform if it is already in the ontology (either namespace style), else None."""
+        for subject in self.g.subjects(RDFS.label, Literal(self.PLATFORM, lang="en")):
+            if platform_of(subject) == self.PLATFORM and (subject, RDFS.subClassOf, None) in self.g:
+                # Older platforms live under 'Platform/<Name>#'; keep minting into their namespace
+                namespace = str(subject).rsplit("#", 1)[0] + "#"
+                if namespace != self.PLATFORM_URI:
+                    self.PLATFORM_URI = namespace
+                    self.PlatformPrefix = Namespace(self.PLATFORM_URI)
+                    self.g.bind(self.PLATFORM_PREFIX, self.PlatformPrefix, override=True)
+                return subject
+        return None
+
+    def labels(self):
+        """The label index of the base ontology, cached next to the TTL; loaded on first use unless one was passed in."""
+        if self.label_index is None:
+            # On a cache miss it is built from self.g while that still holds exactly the file:
+            # not a delta run's graph (only some platforms) and nothing minted yet
+            full_graph = self.g if getattr(self.g, "journal", None) is None and not self.minted else None
+            self.label_index = load_label_index(self.EXISTING_TTL, full_graph)
+        return self.label_index
+
+    def index_existing_platform(self):
+        """
+        Indexes this platform's existing entities by label and its field properties by (parent property, field name).
+        The platform's entities come from the label index, so only their own triples are read.
+        """
+        defined_by = {}
+        parents = {}
+        ranges = {}
+        entity_types = (OWL.Class, OWL.DatatypeProperty, OWL.ObjectProperty)
+        for s in self.labels().platform_terms(self.PLATFORM):
+            if not str(s).startswith(self.PLATFORM_URI):
+                continue
+            for p, o in self.g.predicate_objects(s):
+                if p == RDFS.label:
+                    self.existing_labels.setdefault(o, []).append(s)
+                elif p == RDF.type and o in entity_types:
+                    self.existing_entities.add(s)
+                elif p == RDFS.isDefinedBy:
+                    defined_by[s] = str(o)
+                elif p == RDFS.subPropertyOf:
+                    parents.setdefault(s, []).append(o)
+                elif p == RDFS.range:
+                    ranges[s] = o
+        for prop_uri, field_name in defined_by.items():
+            for parent_uri in parents.get(prop_uri, ()):
+                self.property_registry.setdefault((parent_uri, field_name), (prop_uri, ranges.get(prop_uri)))
+
+    def find_key_property(self, parent_property_uri, field_name):
+        """
+        Returns (property URI, range) of the field below a datatype property: from the properties built
+        or indexed in this run, else by searching the base ontology's property hierarchy, whose
+        closure is cached next to the TTL. Returns (None, None) when there is no such field.
+        """
+        found = self.property_registry.get((parent_property_uri, field_name))
+        if found is not None or self.EXISTING_TTL is None:
+            return found or (None, None)
+        if self.hierarchy is None:
+            self.hierarchy = load_hierarchy(self.EXISTING_TTL)
+        for prop_uri in self.hierarchy.descendants(parent_property_uri):
+            if str(self.g.value(prop_uri, RDFS.isDefinedBy)) == field_name:
+                return prop_uri, self.g.value(prop_uri, RDFS.range)
+        return None, None
+
+    def mint(self, label, *required):
+        """
+        Returns the URI for a new entity of this platform. In update mode, an existing entity
+        with the same label and the given (predicate, object) pairs is reused instead.
+        """
+        if self.update:
+            for uri in self.existing_labels.get(label, ()):
+                if all((uri, p, o) in self.g for p, o in required):
+                    self.touched.add(uri)
+                    return uri
+        uri = self.PlatformPrefix[self.slugs.allocate(self.PLATFORM_URI, str(label), *(f"{p} {o}" for p, o in required))]
+        self.minted.append(uri)
+        if self.update:
+            self.touched.add(uri)
+        return uri
+
+    def set_annotation(self, class_uri, annotation, value):
+        """
+        Stores a string annotation (e.g. :query) on a class; in update mode an unchanged value is
+        left alone and a changed one replaced. Returns True when an existing value was replaced.
+        """
+        annotation_uri = self.BasePrefix[annotation]
+        literal = Literal(value, datatype=XSD.string)
+        replaced = False
+        if self.update:
+            existing = set(self.g.objects(class_uri, annotation_uri))
+            if existing == {literal}:
+                return False
+            if existing:
+                self.g.remove((class_uri, annotation_uri, None))
+                replaced = True
+        self.g.add((annotation_uri, RDF.type, OWL.AnnotationProperty))
+        self.g.add((class_uri, annotation_uri, literal))
+        return replaced
+
+    def set_query(self, class_uri, sql_query, schema_data=None):
+        """Stores a class's :query literal, plus the partition and cluster hints of the tap table it reads."""
+        if self.set_annotation(class_uri, "query", sql_query):
+            self.regenerated_queries += 1
+        if schema_data is not None:
+            self.set_annotation(class_uri, "partitionColumn", PARTITION_COLUMN)
+            self.set_annotation(class_uri, "partitionGranularity", PARTITION_GRANULARITY)
+            cluster_columns = schema_data.get("key_properties", [])
+            if cluster_columns:
+                self.set_annotation(class_uri, "clusterColumns", ",".join(cluster_columns))
+
+    def replication_key(self, schema_data):
+        """The stream's replication key from the Singer catalog (root metadata or legacy top-level field), else None."""
+        for entry in schema_data.get("metadata", []):
+            if entry.get("breadcrumb") == []:
+                metadata = entry.get("metadata", {})
+                key = metadata.get("replication-key") or (metadata.get("valid-replication-keys") or [None])[0]
+                if key:
+                    return key
+        return schema_data.get("replication_key")
+
+    def window_key(self, schema_data):
+        """The replication key bounding the stream's queries: only one that is a top-level column of the stream."""
+        stream = schema_data.get("stream")
+        if stream not in self.window_keys:
+            replication_key = self.replication_key(schema_data)
+            if replication_key and replication_key not in normalize_stream(schema_data).properties:
+                print(f"Warning: Replication key '{replication_key}' of stream '{stream}' is not a top-level column; its queries are not bounded by it.")
+                replication_key = None
+            self.window_keys[stream] = replication_key
+        return self.window_keys[stream]
+
+    def incremental_where(self, table_alias, schema_data=None):
+        """
+        Builds the WHERE clause of a tap query. The partition column is compared bare against a
+        constant (rather than wrapped in date()) so the warehouse can prune partitions; comparing with
+        midnight of the cutoff date keeps the old date(...) >= date(...) semantics.
+        With key_window, rows are further bounded by the stream's replication key; rows without
+        one (replication keys are usually nullable) are kept, as the partition bound alone would.
+        """
+        predicates = [f"{table_alias}.{PARTITION_COLUMN} >= TIMESTAMP(DATE('#cutoff_timestamp'))"]
+        replication_key = self.window_key(schema_data) if (self.key_window and schema_data) else None
+        if replication_key and replication_key != PARTITION_COLUMN:
+            column = f"{table_alias}.`{replication_key}`"
+            predicates.append(f"({column} IS NULL OR {column} >= '#replication_key_start')")
+        return "WHERE " + "\n  AND ".join(predicates)
+
+    def retire_untouched(self):
+        """
+        Update mode: marks this platform's classes and properties that the catalog no longer
+        produces as owl:deprecated, and un-deprecates ones that came back.
+        """
+        deprecated = (OWL.deprecated, Literal(True))
+        retired = revived = 0
+        for uri in self.existing_entities:
+            is_deprecated = (uri, *deprecated) in self.g
+            if uri in self.touched and is_deprecated:
+                self.g.remove((uri, *deprecated))
+                revived += 1
+            elif uri not in self.touched and not is_deprecated:
+                self.g.add((uri, *deprecated))
+                retired += 1
+        new = len(self.touched - self.existing_entities)
+        print(f"Update of {self.PLATFORM}: {new} new, {retired} retired, {revived} revived, {self.regenerated_queries} regenerated queries")
+
+    def category_label(self, category_uri):
+        # Attempt to get a label for better display, fallback to URI fragment
+        label = self.g.value(category_uri, RDFS.label)
+        if not label:
+            label = category_uri.split('#')[-1] if '#' in category_uri else category_uri.split('/')[-1]
+        return str(label)
+
+    def choose_parent_category(self, subclasses):
+        """Asks the user to pick one of the platform categories or to create a new one."""
+        print("Found the following platform categories:")
+        for i, subclass in enumerate(subclasses):
+            print(f"  {i + 1}: {self.category_label(subclass)}")
+
+        print(f"  {len(subclasses) + 1}: Create a new category")
+
+        while True:
+            try:
+                choice = input("Enter the number of the category you want to add this platform to: ")
+                choice_index = int(choice) - 1
+
+                if 0 <= choice_index < len(subclasses):
+                    print(f"Using {self.g.value(subclasses[choice_index], RDFS.label) or subclasses[choice_index]} as the parent class.")
+                    return subclasses[choice_index]
+                elif choice_index == len(subclasses):
+                    # Create a new category
+                    new_category_name = input("\nEnter the name for the new category: ")
+                    return self.create_category(new_category_name)
+                else:
+                    print("Invalid number. Please choose from the list.")
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+
+    def resolve_parent_category(self, parent_category, subclasses):
+        """
+        Finds the platform category given by URI or label ('Sales' and 'SalesPlatform' both match),
+        creating a new category when none matches.
+        """
+        wanted = str(parent_category).strip()
+        for subclass in subclasses:
+            if wanted == str(subclass):
+                return subclass
+        wanted_label = wanted.lower()
+        if not wanted_label.endswith("platform"):
+            wanted_label += "platform"
+        categories = set(subclasses)
+        for match in self.labels().lookup(wanted_label, source="label"):
+            if URIRef(match["uri"]) in categories:
+                print(f"Using {match['label']} as the parent class.")
+                return URIRef(match["uri"])
+        # Unlabelled categories go by their URI fragment, as in category_label
+        for subclass in subclasses:
+            if self.g.value(subclass, RDFS.label) is None and self.category_label(subclass).lower() == wanted_label:
+                print(f"Using {self.category_label(subclass)} as the parent class.")
+                return subclass
+        close = [match["label"] for match in self.labels().fuzzy(wanted_label, source="label") if URIRef(match["uri"]) in categories]
+        if close:
+            print(f"Warning: No category is labelled '{wanted}'; creating it even though {', '.join(close)} is close.")
+        category_name = wanted[:-len("Platform")] if wanted.lower().endswith("platform") else wanted
+        return self.create_category(category_name)
+
+    def create_category(self, new_category_name):
+        new_category_uri = self.BasePrefix[self.slugs.allocate(str(self.BasePrefix), "category", new_category_name)]
+        self.g.add((new_category_uri, RDF.type, OWL.Class))
+        self.g.add((new_category_uri, RDFS.label, Literal(new_category_name + "Platform", lang="en")))
+        self.g.add((new_category_uri, RDFS.subClassOf, self.target_class_uri))
+        self.minted.append(new_category_uri)
+        print(f"Created new category: {new_category_name} with URI: {new_category_uri}")
+        return new_category_uri
+
     def ontology_initialization(self, class_name):
         # create a platform class
 
         # create a main class
-        random_id = self.random_slug()
-        class_uri = self.PlatformPrefix[random_id]
+        class_uri = self.mint(Literal(class_name+"PlatformField", lang="en"), (RDF.type, OWL.Class))
         self.g.add((class_uri, RDF.type, OWL.Class))
         self.g.add((class_uri, RDFS.label, Literal(class_name+"PlatformField", lang="en")))
 
         # create the main property
 
-        random_prop_id = self.random_slug()
-        prop_uri = self.PlatformPrefix[random_prop_id]
+        prop_uri = self.mint(Literal(class_name + "Property", lang="en"), (RDFS.domain, class_uri))
         self.g.add((prop_uri, RDF.type, OWL.DatatypeProperty))
         self.g.add((prop_uri, RDFS.label, Literal(class_name + "Property", lang="en")))
         self.g.add((prop_uri, RDFS.domain, class_uri))  
 
         # Define and add the object property for the relationship
-        relationship_prop_uri = self.PlatformPrefix[self.random_slug()]
-        self.g.add((relationship_prop_uri, RDF.type, OWL.ObjectProperty))
         # Use the dynamic platform name for the label
         relationship_label = f"{self.PLATFORM}Relationship" 
+        relationship_prop_uri = self.mint(Literal(relationship_label, lang="en"), (RDFS.domain, self.new_platform_class_uri))
+        self.g.add((relationship_prop_uri, RDF.type, OWL.ObjectProperty))
         self.g.add((relationship_prop_uri, RDFS.label, Literal(relationship_label, lang="en")))
         # Optionally define domain and range for clarity
         self.g.add((relationship_prop_uri, RDFS.domain, self.new_platform_class_uri))
@@ -142,12 +438,6 @@ class Ontology():
 
         return class_uri, prop_uri, relationship_prop_uri
 
-    def random_slug(self, num_parts=4, part_length=5):
-        return "-".join(
-            "".join(random.choices(string.ascii_lowercase, k=part_length))
-            for _ in range(num_parts)
-        )
-    
     def string_naming(self, input_str):
         # if input_str != self.PLATFORM and input_str.endswith('s'):
         #     input_str = input_str[:-1]
@@ -162,16 +452,15 @@ class Ontology():
         return input_str.replace(" ", "")
 
     def create_class_property(self, label):
-        random_id = self.random_slug()
-        class_uri = self.PlatformPrefix[random_id]
+        self.profiler.count("classes", "stream")
+        class_uri = self.mint(Literal(label, lang="en"), (RDFS.subClassOf, self.main_class_uri), (RDFS.isDefinedBy, Literal(label)))
         self.g.add((class_uri, RDFS.label, Literal(label, lang="en")))
         self.g.add((class_uri, RDF.type, OWL.Class))
         self.g.add((class_uri, RDFS.isDefinedBy, Literal(label)))
         self.g.add((class_uri, RDFS.subClassOf, self.main_class_uri))
 
         # create the property of that class
-        random_prop_id = self.random_slug()
-        prop_uri = self.PlatformPrefix[random_prop_id]
+        prop_uri = self.mint(Literal(label + "Property", lang="en"), (RDFS.domain, class_uri))
         self.g.add((prop_uri, RDF.type, OWL.DatatypeProperty)) # Keep as DatatypeProperty for associating data fields
         self.g.add((prop_uri, RDFS.label, Literal(label + "Property", lang="en")))
         self.g.add((prop_uri, RDFS.domain, class_uri))
@@ -179,57 +468,125 @@ class Ontology():
 
         return class_uri, prop_uri
 
-    def construct_nested_sql_query(self, parent_sql_table_name, array_prop_name, item_schema, parent_key_properties):
-        """Generates SQL query specifically for unnesting an array property."""
+    def parse_json_sql(self, column_sql, python_literals=False):
+        """
+        Parses a JSON text column once. With python_literals, text that only parses after rewriting
+        Python's True/False (as some taps write arrays) falls back to the rewritten form.
+        """
+        parsed = f"SAFE.PARSE_JSON({column_sql}, wide_number_mode=>'round')"
+        if not python_literals:
+            return parsed
+        rewritten = f"SAFE.PARSE_JSON(REPLACE(REPLACE({column_sql}, 'True', 'true'), 'False', 'false'), wide_number_mode=>'round')"
+        return f"COALESCE({parsed}, {rewritten})"
+
+    def json_field_sql(self, json_sql, field=None, field_schema=None):
+        """
+        Selects a field (or, without a field, the value itself) from a JSON value.
+        In "extract" mode the value is JSON text and the field comes back as STRING; in "parse" mode
+        the value is already parsed JSON and scalars are cast to the BigQuery type of their XSD range.
+        """
+        path = f"'$.{field}'" if field is not None else None
+        if self.json_mode != "parse":
+            if path is None:
+                return f"SAFE_CAST({json_sql} AS STRING)"
+            return f"SAFE_CAST(JSON_EXTRACT_SCALAR({json_sql}, {path}) AS STRING)"
+
+        args = f"{json_sql}, {path}" if path else json_sql
+        datatype = field_schema.type if field_schema is not None else "string"
+        if datatype in ("object", "array"):
+            return f"TO_JSON_STRING(JSON_QUERY({args}))" if path else f"TO_JSON_STRING({json_sql})"
+        sql_type = bigquery_type_map[type_map.get(datatype, XSD.string)]
+        if sql_type == "STRING":
+            return f"JSON_VALUE({args})"
+        return f"SAFE_CAST(JSON_VALUE({args}) AS {sql_type})"
+
+    def construct_nested_sql_query(self, parent_sql_table_name, array_prop_name, item_schema, parent_key_properties, array_path=(), schema_data=None):
+        """
+        Generates SQL query specifically for unnesting an array property; item_schema is the item's Field.
+        array_path lists the enclosing arrays (outermost first) as (prop_name, item_key_fields) pairs;
+        their UNNESTs are chained so every nesting level is reached in one scan of the tap table.
+        """
         select_clauses = []
         table_alias = "t"
-        safe_prop_name_for_alias = ''.join(c if c.isalnum() else '_' for c in array_prop_name)
-        array_alias = f"unnested_{safe_prop_name_for_alias}"
+
+        # One UNNEST per level, outermost first: (prop_name, alias) with unique aliases
+        levels = []
+        used_aliases = set()
+        for level_prop_name in [name for name, _ in array_path] + [array_prop_name]:
+            safe_prop_name_for_alias = ''.join(c if c.isalnum() else '_' for c in level_prop_name)
+            alias = f"unnested_{safe_prop_name_for_alias}"
+            if alias in used_aliases:
+                alias = f"{alias}_{len(levels)}"
+            used_aliases.add(alias)
+            levels.append((level_prop_name, alias))
+        array_alias = levels[-1][1]
 
         # Select parent key properties
         for pk in parent_key_properties:
             quoted_pk_alias = f"`Parent_{pk}`"
             select_clauses.append(f"{table_alias}.`{pk}` AS {quoted_pk_alias}")
 
-        # Select properties from the unnested item
-        item_types = item_schema.get("type", [])
-        if not isinstance(item_types, list):
-            item_types = [item_types]
-        clean_item_types = [t for t in item_types if t != "null"]
-        primary_item_type = clean_item_types[0] if clean_item_types else "string"
+        # Select the keys of every enclosing array item (the key lineage)
+        for (ancestor_name, ancestor_keys), (_, ancestor_alias) in zip(array_path, levels):
+            for key in ancestor_keys:
+                select_clauses.append(f"{self.json_field_sql(ancestor_alias, key)} AS `Parent_{ancestor_name}_{key}`")
 
-        if primary_item_type == "object":
-            item_properties = item_schema.get("properties", {})
-            if not item_properties:
-                select_clauses.append(f"SAFE_CAST({array_alias} AS STRING) AS `{array_prop_name}_object_value`")
+        # Select properties from the unnested item
+        if item_schema.type == "object":
+            if not item_schema.properties:
+                select_clauses.append(f"{self.json_field_sql(array_alias, field_schema=item_schema)} AS `{array_prop_name}_object_value`")
             else:
-                for sub_prop_name, sub_prop_details in item_properties.items():
+                for sub_prop_name, sub_field in item_schema.properties.items():
                     quoted_alias = f"`{sub_prop_name}`"
-                    select_clauses.append(f"SAFE_CAST(JSON_EXTRACT_SCALAR({array_alias}, '$.{sub_prop_name}') AS STRING) AS {quoted_alias}")
+                    select_clauses.append(f"{self.json_field_sql(array_alias, sub_prop_name, sub_field)} AS {quoted_alias}")
         else:
             quoted_alias = f"`{array_prop_name}_value`"
-            select_clauses.append(f"SAFE_CAST({array_alias} AS STRING) AS {quoted_alias}")
+            select_clauses.append(f"{self.json_field_sql(array_alias, field_schema=item_schema)} AS {quoted_alias}")
 
         # Add _time_loaded from parent
         select_clauses.append(f"{table_alias}._time_loaded")
 
         select_statement = "SELECT\n  " + ",\n  ".join(list(dict.fromkeys(select_clauses)))
         from_statement = f"FROM\n  `cohesyve-us.#database_id.{self.TAP}__{parent_sql_table_name}` AS {table_alias}"
-        unnest_join = f"LEFT JOIN UNNEST(COALESCE(JSON_EXTRACT_ARRAY(REPLACE(REPLACE({table_alias}.`{array_prop_name}`, 'True', 'true'), 'False', 'false')), [])) AS {array_alias}"
-        where_statement = f"WHERE date({table_alias}._time_loaded) >= date('#cutoff_timestamp')"
+        # The outermost array is a column of the tap table; deeper arrays are read from the enclosing item's JSON
+        unnest_joins = []
+        for i, (level_prop_name, alias) in enumerate(levels):
+            if self.json_mode == "parse":
+                # The column is parsed once per row; deeper levels walk the parsed value
+                if i == 0:
+                    array_sql = f"JSON_QUERY_ARRAY({self.parse_json_sql(f'{table_alias}.`{level_prop_name}`', python_literals=True)})"
+                else:
+                    array_sql = f"JSON_QUERY_ARRAY({levels[i - 1][1]}, '$.{level_prop_name}')"
+            elif i == 0:
+                array_sql = f"JSON_EXTRACT_ARRAY(REPLACE(REPLACE({table_alias}.`{level_prop_name}`, 'True', 'true'), 'False', 'false'))"
+            else:
+                array_sql = f"JSON_EXTRACT_ARRAY({levels[i - 1][1]}, '$.{level_prop_name}')"
+            unnest_joins.append(f"LEFT JOIN UNNEST(COALESCE({array_sql}, [])) AS {alias}")
+        where_statement = self.incremental_where(table_alias, schema_data)
 
-        full_query = f"{select_statement}\n{from_statement}\n{unnest_join}\n{where_statement}"
+        full_query = f"{select_statement}\n{from_statement}\n" + "\n".join(unnest_joins) + f"\n{where_statement}"
         return full_query
 
-    def process_array_property(self, parent_class_uri, parent_datatype_property_uri, parent_class_label, parent_sql_table_name, prop_name, prop_details, schema_data):
+    def array_item_keys(self, item_schema, key_properties):
+        """The fields that identify an array item: the stream's key fields, where the item has them."""
+        return [key for key in key_properties if key in item_schema.properties]
+
+    def process_array_property(self, parent_class_uri, parent_datatype_property_uri, parent_class_label, parent_sql_table_name, prop_name, prop_field, schema_data, array_path=(), root_datatype_property_uri=None):
         """
         Handles array properties recursively by creating a new class, properties, SQL query,
         and equivalentProperty links. Processes nested arrays within objects.
+        prop_field is the array's normalized Field (see catalog_schema); array_path lists the enclosing
+        arrays (outermost first) as (prop_name, item Field, item datatype property) tuples, so nested
+        item classes carry the keys of the stream and of every enclosing item.
         """
-        item_schema = prop_details.get("items", {})
-        if not item_schema:
+        root_datatype_property_uri = root_datatype_property_uri or parent_datatype_property_uri
+        array_names = [name for name, _, _ in array_path] + [prop_name]
+        self.profiler.record_depth(".".join([schema_data.get("stream", "")] + array_names), len(array_names))
+        item_schema = prop_field.items
+        if item_schema is None:
             print(f"Warning: Array property '{prop_name}' in '{parent_class_label}' has no item schema defined. Skipping.")
             return
+        self.profiler.count("classes", "array_item")
 
         # --- Create Class and Properties for the Array Items ---
         # Use a more descriptive label incorporating the parent and property name
@@ -238,14 +595,14 @@ class Ontology():
         # Ensure uniqueness if the same array structure appears elsewhere (optional, depends on desired ontology structure)
         # nested_class_label = f"{parent_class_label}_{prop_name}_Items" # Alternative naming
 
-        nested_class_uri = self.PlatformPrefix[self.random_slug()]
+        nested_class_uri = self.mint(Literal(nested_class_label, lang="en"), (RDFS.subClassOf, self.main_class_uri))
         self.g.add((nested_class_uri, RDF.type, OWL.Class))
         self.g.add((nested_class_uri, RDFS.label, Literal(nested_class_label, lang="en")))
         # Link nested class back to the main platform-specific field class
         self.g.add((nested_class_uri, RDFS.subClassOf, self.main_class_uri)) # All fields/items subclass the main field type
 
         # Datatype property for holding the fields of the items in this array
-        nested_prop_uri = self.PlatformPrefix[self.random_slug()]
+        nested_prop_uri = self.mint(Literal(f"{nested_class_label}Property", lang="en"), (RDFS.domain, nested_class_uri))
         self.g.add((nested_prop_uri, RDF.type, OWL.DatatypeProperty))
         self.g.add((nested_prop_uri, RDFS.label, Literal(f"{nested_class_label}Property", lang="en")))
         self.g.add((nested_prop_uri, RDFS.domain, nested_class_uri))
@@ -254,7 +611,7 @@ class Ontology():
 
         # Object property linking the parent class to this nested item class
         object_prop_label = f"has{self.string_naming(prop_name)}Item" # Use string_naming
-        object_prop_uri = self.PlatformPrefix[self.random_slug()]
+        object_prop_uri = self.mint(Literal(object_prop_label, lang="en"), (RDFS.domain, parent_class_uri), (RDFS.range, nested_class_uri))
         self.g.add((object_prop_uri, RDF.type, OWL.ObjectProperty))
         self.g.add((object_prop_uri, RDFS.label, Literal(object_prop_label, lang="en")))
         self.g.add((object_prop_uri, RDFS.domain, parent_class_uri)) # Domain is the class containing the array
@@ -263,40 +620,23 @@ class Ontology():
         self.g.add((object_prop_uri, RDFS.subPropertyOf, self.main_relationship_uri))
 
         # --- Process Item Schema (Recursive Step) ---
-        item_types = item_schema.get("type", [])
-        if not isinstance(item_types, list):
-            item_types = [item_types]
-        clean_item_types = [t for t in item_types if t != "null"]
-        primary_item_type = clean_item_types[0] if clean_item_types else "string" # Default to string if no type found
+        primary_item_type = item_schema.type
 
+        nested_arrays = []
         if primary_item_type == "object":
-            item_properties = item_schema.get("properties", {})
+            item_properties = item_schema.properties
             if not item_properties:
                  print(f"Warning: Array property '{prop_name}' contains objects with no properties defined in schema. Creating a placeholder value property.")
                  # Create a placeholder if object has no defined properties
                  self.create_subproperty(nested_prop_uri, f"{prop_name}_object_value", "string", is_primary_key=False)
             else:
-                for sub_prop_name, sub_prop_details in item_properties.items():
-                    sub_types = sub_prop_details.get("type", [])
-                    if not isinstance(sub_types, list):
-                        sub_types = [sub_types]
-                    clean_sub_types = [st for st in sub_types if st != "null"]
-                    primary_sub_type = clean_sub_types[0] if clean_sub_types else "string"
-
-                    # === Recursive Call for Nested Arrays ===
+                for sub_prop_name, sub_field in item_properties.items():
+                    primary_sub_type = sub_field.type
+
+                    # === Nested Arrays (recursed into once this item's own fields exist) ===
                     if primary_sub_type == "array":
                         print(f"      - Found nested array '{sub_prop_name}' within '{prop_name}'. Processing recursively.")
-                        # Note: The SQL generated by the recursive call might need adjustments for >1 level nesting,
-                        # as construct_nested_sql_query assumes unnesting from the original parent_sql_table_name.
-                        self.process_array_property(
-                            nested_class_uri,           # Parent class is the one we just created
-                            nested_prop_uri,            # Parent property is the one we just created
-                            nested_class_label,         # Parent label is the one we just created
-                            parent_sql_table_name,      # Base table for SQL remains the original parent
-                            sub_prop_name,              # Current property name is the sub-property's name
-                            sub_prop_details,           # Current property details are the sub-property's
-                            schema_data                 # Pass original schema_data for key_properties lookup
-                        )
+                        nested_arrays.append((sub_prop_name, sub_field))
                     # === Handle Nested Objects (Non-Array) ===
                     # elif primary_sub_type == "object":
                         # Decide how to handle nested objects that are *not* arrays.
@@ -309,7 +649,7 @@ class Ontology():
                         # print(f"      - Processing nested object property '{sub_prop_name}' within '{prop_name}'.")
                         # self.create_subproperty(nested_prop_uri, sub_prop_name, primary_sub_type, is_primary_key=False)
                         # If choosing Option 1 (flattening further):
-                        # nested_object_props = sub_prop_details.get("properties", {})
+                        # nested_object_props = sub_field.properties
                         # for n_obj_prop, n_obj_details in nested_object_props.items():
                         #    # ... get type ...
                         #    self.create_subproperty(nested_prop_uri, f"{sub_prop_name}_{n_obj_prop}", n_obj_type, False)
@@ -335,81 +675,105 @@ class Ontology():
             self.create_subproperty(nested_prop_uri, value_prop_label, primary_item_type, is_primary_key=False)
 
         # --- Generate SQL Query for this level of unnesting ---
-        # Note: This query unnests THIS array from its direct parent table.
-        # Deeper nested arrays handled by recursive calls will generate their own queries,
-        # potentially requiring manual combination or CTEs for a single, multi-level unnesting query.
+        # The query unnests every enclosing array in turn, starting from the tap table, so that
+        # this level is reached in a single scan; it selects the stream keys plus every enclosing item's keys.
         parent_key_properties = schema_data.get("key_properties", [])
-        nested_sql_query = self.construct_nested_sql_query(parent_sql_table_name, prop_name, item_schema, parent_key_properties)
-        query_uri = self.BasePrefix["query"]
-        self.g.add((nested_class_uri, query_uri, Literal(nested_sql_query, datatype=XSD.string)))
-
-        # --- Add equivalentProperty links for parent primary keys ---
-        # This links the parent's PK property to the corresponding 'Parent_PK' property created in the nested class
-        # This helps establish the foreign key relationship in the ontology.
-        if parent_key_properties: # Only proceed if parent has defined key properties
-            for pk in parent_key_properties:
-                parent_pk_prop_uri = None
-                # Find the parent's specific property URI for this key by searching its subproperties
-                for parent_sub_prop in self.g.subjects(predicate=RDFS.subPropertyOf, object=parent_datatype_property_uri):
-                    # Check if this subproperty's RDFS.isDefinedBy matches the primary key name
-                    defined_by_label = self.g.value(subject=parent_sub_prop, predicate=RDFS.isDefinedBy)
-                    if defined_by_label == Literal(pk):
-                        parent_pk_prop_uri = parent_sub_prop
-                        break # Found it
+        ancestor_keys = [(name, self.array_item_keys(schema, parent_key_properties), prop_uri) for name, schema, prop_uri in array_path]
+        with self.profiler.timed("sql_generation"):
+            nested_sql_query = self.construct_nested_sql_query(parent_sql_table_name, prop_name, item_schema, parent_key_properties,
+                                                               [(name, keys) for name, keys, _ in ancestor_keys], schema_data)
+        self.set_query(nested_class_uri, nested_sql_query, schema_data)
+
+        # --- Add equivalentProperty links for the key lineage ---
+        # This links the stream's PK property to the corresponding 'Parent_PK' property created in the nested class,
+        # and each enclosing item's key to a 'Parent_<array>_<key>' property.
+        # This helps establish the foreign key relationships in the ontology.
+        lineage = [(pk, f"Parent_{pk}", root_datatype_property_uri) for pk in parent_key_properties]
+        for name, keys, prop_uri in ancestor_keys:
+            lineage.extend((key, f"Parent_{name}_{key}", prop_uri) for key in keys)
+        if lineage: # Only proceed if parent has defined key properties
+            for pk, nested_pk_label, key_parent_property_uri in lineage:
+                # Find the parent's specific property URI for this key (registry first, then the base ontology)
+                with self.profiler.timed("foreign_key_lookup"):
+                    parent_pk_prop_uri, parent_pk_datatype_uri = self.find_key_property(key_parent_property_uri, pk)
+
+                # Determine the datatype of the parent key to use for the nested key
+                parent_pk_datatype_str = xsd_to_str_map.get(parent_pk_datatype_uri, "string") # Default to string
+
+                # Create the corresponding property in the nested class (acts as FK); the query selects
+                # the column either way, so it is defined even when the parent key can't be linked
+                # Use the naming convention matching the SQL alias from construct_nested_sql_query
+                nested_pk_prop_uri = self.create_subproperty(
+                    nested_prop_uri,        # Parent property is the main datatype property of the nested class
+                    nested_pk_label,        # Label matches SQL alias convention
+                    parent_pk_datatype_str, # Use the same datatype as the parent PK
+                    is_primary_key=False    # It's a foreign key conceptually, not the PK of the nested item itself
+                )
 
                 if parent_pk_prop_uri:
-                    # Determine the datatype of the parent key to use for the nested key
-                    parent_pk_datatype_uri = self.g.value(subject=parent_pk_prop_uri, predicate=RDFS.range)
-                    parent_pk_datatype_str = xsd_to_str_map.get(parent_pk_datatype_uri, "string") # Default to string
-
-                    # Create the corresponding property in the nested class (acts as FK)
-                    # Use the naming convention matching the SQL alias from construct_nested_sql_query
-                    nested_pk_label = f"Parent_{pk}"
-                    nested_pk_prop_uri = self.create_subproperty(
-                        nested_prop_uri,        # Parent property is the main datatype property of the nested class
-                        nested_pk_label,        # Label matches SQL alias convention
-                        parent_pk_datatype_str, # Use the same datatype as the parent PK
-                        is_primary_key=False    # It's a foreign key conceptually, not the PK of the nested item itself
-                    )
-
                     # Add the equivalentProperty link
                     self.g.add((nested_pk_prop_uri, OWL.equivalentProperty, parent_pk_prop_uri))
                     print(f"      - Added equivalentProperty link for '{pk}' between <{nested_pk_prop_uri.n3()}> and <{parent_pk_prop_uri.n3()}>")
                 else:
                     # This might happen if the key_properties listed in JSON don't match properties found in the schema block
-                    print(f"Warning: Could not find parent property URI for primary key '{pk}' defined by '{pk}' under property <{parent_datatype_property_uri.n3()}>. Cannot add equivalentProperty link.")
+                    print(f"Warning: Could not find parent property URI for primary key '{pk}' defined by '{pk}' under property <{key_parent_property_uri.n3()}>. Cannot add equivalentProperty link.")
         # --- End equivalentProperty links ---
 
+        # === Recursive Calls for Nested Arrays ===
+        for sub_prop_name, sub_field in nested_arrays:
+            self.process_array_property(
+                nested_class_uri,           # Parent class is the one we just created
+                nested_prop_uri,            # Parent property is the one we just created
+                nested_class_label,         # Parent label is the one we just created
+                parent_sql_table_name,      # Base table for SQL remains the original parent
+                sub_prop_name,              # Current property name is the sub-property's name
+                sub_field,                  # Current property is the sub-property's Field
+                schema_data,                # Pass original schema_data for key_properties lookup
+                array_path + ((prop_name, item_schema, nested_prop_uri),),
+                root_datatype_property_uri
+            )
+
         print(f"    - Processed array property '{prop_name}' into new class <{nested_class_uri.n3()}>")
 
 
     def construct_class_sql_query(self, class_name, properties, schema_data):
+        """Generates the SQL query for a stream's class; properties maps field names to the stream's top-level Fields."""
         select_clauses_main = []
         from_clause_parts = []
         table_alias = "t"
         table_name_formatted = class_name.lower().replace('platformfield', '').replace('property', '')
         from_clause_parts.append(f"`cohesyve-us.#database_id.{self.TAP}__{table_name_formatted}` AS {table_alias}")
 
-        for prop_name, prop_details in properties.items():
+        # In "parse" mode, every object column is parsed once per row into one struct
+        parsed_alias = "j"
+        parsed_columns = []
+
+        for prop_name, prop_field in properties.items():
             original_prop_name = prop_name
             quoted_prop_alias = f"`{prop_name}`"
 
-            types = prop_details.get("type", [])
-            if not isinstance(types, list):
-                types = [types]
-            clean_types = [t for t in types if t != "null"]
-            primary_type = clean_types[0] if clean_types else "string"
+            primary_type = prop_field.type
 
             if primary_type == "array":
                 continue
             elif primary_type == "object":
-                object_properties = prop_details.get("properties", {})
-                for sub_prop_name, sub_prop_details in object_properties.items():
+                object_properties = prop_field.properties
+                if self.json_mode == "parse":
+                    if object_properties:
+                        parsed_columns.append(original_prop_name)
+                    json_sql = f"{parsed_alias}.`{original_prop_name}`"
+                else:
+                    json_sql = f"{table_alias}.`{original_prop_name}`"
+                for sub_prop_name, sub_field in object_properties.items():
                     quoted_alias = f"`{original_prop_name}_{sub_prop_name}`"
-                    select_clauses_main.append(f"SAFE_CAST(JSON_EXTRACT_SCALAR({table_alias}.`{original_prop_name}`, '$.{sub_prop_name}') AS STRING) AS {quoted_alias}")
+                    select_clauses_main.append(f"{self.json_field_sql(json_sql, sub_prop_name, sub_field)} AS {quoted_alias}")
             else:
                 select_clauses_main.append(f"{table_alias}.`{original_prop_name}` AS {quoted_prop_alias}")
 
+        if parsed_columns:
+            parsed_fields = ", ".join(f"{self.parse_json_sql(f'{table_alias}.`{name}`')} AS `{name}`" for name in parsed_columns)
+            from_clause_parts.append(f"CROSS JOIN UNNEST([STRUCT({parsed_fields})]) AS {parsed_alias}")
+
         has_time_loaded = '_time_loaded' in properties
         if not has_time_loaded:
             select_clauses_main.append(f"{table_alias}._time_loaded")
@@ -430,7 +794,7 @@ class Ontology():
 
         select_statement = "SELECT\n  " + ",\n  ".join(all_select_clauses)
         from_statement = "FROM\n  " + "\n  ".join(from_clause_parts)
-        where_statement = f"WHERE date({table_alias}._time_loaded) >= date('#cutoff_timestamp')" if has_time_loaded else ""
+        where_statement = self.incremental_where(table_alias, schema_data) if has_time_loaded else ""
 
         full_query = f"{select_statement}\n{from_statement}"
         if where_statement:
@@ -439,17 +803,37 @@ class Ontology():
         return full_query
 
     def create_subproperty(self, parent_class_uri, prop_name, datatype, is_primary_key=False):
-        random_id = self.random_slug()
-        prop_uri = self.PlatformPrefix[random_id]
+        range_uri = type_map.get(datatype, XSD.string)
+        self.profiler.count("properties_by_type", xsd_to_str_map.get(range_uri, datatype))
+        is_primary_key_uri = self.BasePrefix["isPrimaryKey"]
+        primary_key_flag = Literal("true", datatype=XSD.boolean)
+
+        # In update mode, an existing field keeps its URI; only a changed type or key flag is rewritten
+        existing = self.property_registry.get((parent_class_uri, prop_name)) if self.update else None
+        if existing is not None:
+            prop_uri, existing_range_uri = existing
+            self.touched.add(prop_uri)
+            if existing_range_uri != range_uri:
+                self.g.remove((prop_uri, RDFS.range, None))
+                self.g.add((prop_uri, RDFS.range, range_uri))
+                self.property_registry[(parent_class_uri, prop_name)] = (prop_uri, range_uri)
+            if is_primary_key:
+                self.g.add((prop_uri, is_primary_key_uri, primary_key_flag))
+            else:
+                self.g.remove((prop_uri, is_primary_key_uri, None))
+            return prop_uri
+
+        prop_uri = self.mint(Literal(prop_name), (RDFS.subPropertyOf, parent_class_uri))
         self.g.add((prop_uri, RDF.type, OWL.DatatypeProperty))
         self.g.add((prop_uri, RDFS.subPropertyOf, parent_class_uri))
         self.g.add((prop_uri, RDFS.label, Literal(prop_name)))
-        self.g.add((prop_uri, RDFS.range, type_map.get(datatype, XSD.string)))
+        self.g.add((prop_uri, RDFS.range, range_uri))
         self.g.add((prop_uri, RDFS.isDefinedBy, Literal(prop_name)))
+        # Keep the first property registered for a field, as the old subPropertyOf scan did
+        self.property_registry.setdefault((parent_class_uri, prop_name), (prop_uri, range_uri))
 
         if is_primary_key:
-            is_primary_key_uri = self.BasePrefix["isPrimaryKey"]
-            self.g.add((prop_uri, is_primary_key_uri, Literal("true", datatype=XSD.boolean)))
+            self.g.add((prop_uri, is_primary_key_uri, primary_key_flag))
 
         return prop_uri
 
@@ -458,42 +842,33 @@ class Ontology():
         table_name_formatted = original_class_name.lower()
 
         current_class, current_datatype_property = self.create_class_property(class_name)
-        object_schema = schema_data.get("schema", {})
-        properties = object_schema.get('properties', {})
+        # The stream's schema is normalized once ($ref / anyOf / oneOf resolved, primary types picked)
+        properties = normalize_stream(schema_data).properties
         if not properties:
             print(f"Warning: No properties found for stream '{original_class_name}'. Skipping property processing.")
             return current_datatype_property
 
-        for prop_name, prop_details in properties.items():
-            types = prop_details.get("type", [])
-            if not isinstance(types, list):
-                types = [types]
-
-            clean_types = [t for t in types if t != "null"]
-            primary_type = clean_types[0] if clean_types else "string"
-
-            is_primary_key = prop_name in schema_data.get("key_properties", [])
+        for prop_name, prop_field in properties.items():
+            primary_type = prop_field.type
+            is_primary_key = prop_field.is_key
 
             if primary_type == "array":
-                self.process_array_property(current_class, current_datatype_property, class_name, table_name_formatted, prop_name, prop_details, schema_data)
+                self.process_array_property(current_class, current_datatype_property, class_name, table_name_formatted, prop_name, prop_field, schema_data)
             elif primary_type == "object":
                 # Optionally handle nested objects directly if needed, or skip like arrays
                 # For now, skipping direct processing of object properties here, assuming they might be handled if nested within arrays or need separate logic
                 print(f"  - Skipping direct processing for object property '{prop_name}' in '{class_name}'. Nested properties defined via subProperty.")
                 # If you need to create subproperties for nested object fields:
-                # object_props = prop_details.get("properties", {})
-                # for sub_prop, sub_details in object_props.items():
-                #     sub_types = sub_details.get("type", [])
-                #     # ... process sub_types ...
+                # for sub_prop, sub_field in prop_field.properties.items():
                 #     self.create_subproperty(current_datatype_property, f"{prop_name}_{sub_prop}", sub_primary_type, is_primary_key=False) # Adjust naming as needed
                 pass # Keep pass if skipping direct processing here
             else:
                 self.create_subproperty(current_datatype_property, prop_name, primary_type, is_primary_key)
 
-        class_sql_query = self.construct_class_sql_query(class_name, properties, schema_data)
+        with self.profiler.timed("sql_generation"):
+            class_sql_query = self.construct_class_sql_query(class_name, properties, schema_data)
 
-        query_uri = self.BasePrefix["query"]
-        self.g.add((current_class, query_uri, Literal(class_sql_query, datatype=XSD.string)))
+        self.set_query(current_class, class_sql_query, schema_data)
 
         return current_datatype_property
 
@@ -553,7 +928,244 @@ def get_output_file_input(default_extension=".ttl"):
                 return user_input
         return user_input
 
+def build_stream_fragment(job):
+    """Process-pool worker: builds one stream into its own small graph and returns its triples and slugs."""
+    platform, tap, main_uris, class_name, single_schema, key_window, json_mode = job
+    fragment = Ontology.fragment(platform, tap, *main_uris, key_window=key_window, json_mode=json_mode)
+    fragment.process_schema(class_name, single_schema, *main_uris)
+    return list(fragment.g), fragment.slugs.allocated
+
+def process_catalog(working_ontology, schema_data, pool=None):
+    """
+    Adds the platform classes and every selected stream of a Singer catalog to the ontology graph.
+    schema_data is the parsed catalog or an iterable of its streams (see iter_catalog_streams).
+    With a process pool, each stream is built as an independent graph fragment in a worker and
+    the fragments are merged into the graph in one bulk step, in catalog order.
+    """
+    if pool is not None and working_ontology.update:
+        # Update mode matches against the existing platform subgraph, which workers don't have
+        print("Note: Update mode processes streams serially.")
+        pool = None
+
+    profiler = working_ontology.profiler
+    platform_name_formatted = working_ontology.string_naming(working_ontology.PLATFORM)
+    class_uri, property_uri, relationship_uri = working_ontology.ontology_initialization(platform_name_formatted)
+
+    streams = schema_data.get('streams', []) if isinstance(schema_data, dict) else schema_data
+
+    jobs = []
+    seen = 0
+    for single_schema in streams:
+        seen += 1
+        root_class_name = single_schema.get("stream")
+        if not root_class_name:
+            print("Warning: Skipping stream with missing 'stream' key.")
+            continue
+
+        if not is_selected(single_schema):
+            print(f"Skipping stream '{root_class_name}' as it is not selected.")
+            continue
+
+        root_class_name_formatted = working_ontology.string_naming(root_class_name)
+        if pool is None:
+            print(f"Processing stream: {root_class_name}...")
+            with profiler.span("stream", working_ontology.g, stream=root_class_name,
+                               fields=len(single_schema.get("schema", {}).get("properties", {}))):
+                working_ontology.process_schema(root_class_name_formatted, single_schema, class_uri, property_uri, relationship_uri)
+        else:
+            print(f"Queueing stream: {root_class_name}...")
+            main_uris = (class_uri, property_uri, relationship_uri)
+            jobs.append((working_ontology.PLATFORM, working_ontology.TAP, main_uris, root_class_name_formatted, single_schema,
+                         working_ontology.key_window, working_ontology.json_mode))
+
+    if jobs:
+        # map() yields results in submission order, so the merged graph is deterministic.
+        # Streams built in workers are profiled as one span; their internals are not instrumented.
+        merged = []
+        with profiler.span("stream_workers", working_ontology.g, streams=len(jobs)):
+            for job, (fragment, slugs) in zip(jobs, pool.map(build_stream_fragment, jobs)):
+                # Workers can't see slugs used elsewhere; a clashing stream is rebuilt serially
+                if working_ontology.slugs.reserve(slugs):
+                    print(f"Slug collision in stream fragment for '{job[3]}'. Rebuilding it serially.")
+                    working_ontology.process_schema(job[3], job[4], *job[2])
+                else:
+                    merged.append(fragment)
+                    working_ontology.minted.extend(s for s, p, o in fragment if p == RDFS.label)
+            g = working_ontology.g
+            g.addN((s, p, o, g) for fragment in merged for s, p, o in fragment)
+        print(f"Merged {len(merged)} stream fragment(s) into the ontology.")
+
+    if working_ontology.update:
+        with profiler.span("retire_untouched", working_ontology.g):
+            working_ontology.retire_untouched()
+
+    # Later catalogs of a batch find this one's categories and entities in the shared label index
+    if working_ontology.label_index is not None:
+        working_ontology.label_index.add_terms(working_ontology.g, working_ontology.minted)
+
+    if not seen:
+        print("Warning: No 'streams' found in the catalog file.")
+
+def make_pool(workers):
+    """Returns a process pool for stream fragments, or None for serial processing."""
+    if not workers or workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+def load_manifest(manifest_file):
+    """
+    Reads a batch manifest of the form
+    {"base_ontology": "...ttl", "output": "...ttl",
+     "entries": [{"catalog": "...json", "platform": "Razorpay", "tap": "razorpay", "category": "Payments"}]}
+    An entry may set "update": true to re-onboard a platform already in the ontology, and
+    "key_window": true to bound its queries by replication key, and "json_mode" overrides --json-mode.
+    Relative paths are resolved against the manifest's directory.
+    """
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    resolve = lambda path: path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+    for key in ("base_ontology", "output", "entries"):
+        if key not in manifest:
+            raise ValueError(f"Manifest '{manifest_file}' is missing '{key}'")
+    manifest["base_ontology"] = resolve(manifest["base_ontology"])
+    manifest["output"] = resolve(manifest["output"])
+    for i, entry in enumerate(manifest["entries"]):
+        for key in ("catalog", "platform", "tap", "category"):
+            if not entry.get(key):
+                raise ValueError(f"Manifest entry {i + 1} is missing '{key}'")
+        entry["catalog"] = resolve(entry["catalog"])
+    return manifest
+
+# Triple stores for the run's graph: integer-interned arrays (default) or rdflib's Memory store
+GRAPH_STORES = {
+    "compact": lambda: JournalGraph(store=CompactStore()),
+    "memory": JournalGraph,
+}
+
+def load_base_graph(existing_ontology_file, delta_format=None, platforms=None, store="compact"):
+    """
+    Loads the base ontology; in delta mode, journals every triple added afterwards.
+    Since a delta never rewrites the rest of the ontology, delta mode only loads the core
+    plus the platforms being onboarded.
+    """
+    g = load_graph(existing_ontology_file, graph_class=GRAPH_STORES[store], platforms=platforms if delta_format else None, onboarding=True)
+    if delta_format:
+        g.start_journal()
+    return g
+
+def write_output(g, output_ontology_file, delta_format=None):
+    """Serializes the whole graph, or in delta mode appends only the triples added during this run."""
+    if delta_format:
+        count = write_delta(g, g.journal, output_ontology_file, delta_format, g.retracted)
+        print(f"Appended {count} new triples to {output_ontology_file} ({delta_format} delta)")
+    else:
+        serialize_graph(g, output_ontology_file)
+
+def check_output(g, report_file):
+    """Runs the integrity checks on the onboarded graph and writes the findings as JSON."""
+    findings = check_graph(g)
+    summary = summarize(findings)
+    with open(report_file, "w") as f:
+        json.dump({"triples": len(g), "summary": summary, "findings": findings}, f, indent=2)
+    print(f"Integrity check: {summary['error']} error(s), {summary['warning']} warning(s). Report saved to {report_file}")
+
+def run_batch(manifest, workers=None, delta_format=None, update=False, key_window=False, json_mode="extract", store="compact", profiler=NULL_PROFILER, check_report=None):
+    """
+    Onboards every catalog in a manifest (as returned by load_manifest) with one base-ontology load and one serialize.
+    Returns False, writing nothing, when a file is missing or a catalog can't be read.
+    """
+    existing_ontology_file = manifest["base_ontology"]
+    output_ontology_file = manifest["output"]
+
+    if not os.path.isfile(existing_ontology_file):
+        print(f"Error: Base ontology file not found at '{existing_ontology_file}'")
+        return False
+    for entry in manifest["entries"]:
+        if not os.path.isfile(entry["catalog"]):
+            print(f"Error: Catalog file not found at '{entry['catalog']}'")
+            return False
+
+    with profiler.span("load_base_graph") as span:
+        g = load_base_graph(existing_ontology_file, delta_format, [entry["platform"] for entry in manifest["entries"]], store)
+    if profiler.enabled:
+        span["triples"] = len(g)
+    with profiler.span("label_index"):
+        # A delta run's graph only holds some platforms, so the index is then built from the whole file
+        label_index = load_label_index(existing_ontology_file, None if delta_format else g)
+    with profiler.span("slug_allocator"):
+        slugs = SlugAllocator.from_graph(g)
+    pool = make_pool(workers)
+    try:
+        for number, entry in enumerate(manifest["entries"], 1):
+            print(f"\n--- Onboarding {entry['platform']} ({entry['tap']}) from {entry['catalog']} ---")
+            try:
+                with profiler.span("catalog", g, platform=entry["platform"], catalog=entry["catalog"]):
+                    with profiler.span("init_platform", g):
+                        working_ontology = Ontology(existing_ontology_file, entry["catalog"], output_ontology_file,
+                                                    entry["platform"], entry["tap"], parent_category=entry["category"], graph=g,
+                                                    update=entry.get("update", update), key_window=entry.get("key_window", key_window),
+                                                    json_mode=entry.get("json_mode", json_mode), label_index=label_index, slugs=slugs)
+                    working_ontology.profiler = profiler
+                    # The catalog is read incrementally as its streams are processed
+                    process_catalog(working_ontology, iter_catalog_streams(entry["catalog"]), pool)
+            except json.JSONDecodeError as e:
+                print(f"Error parsing JSON catalog file '{entry['catalog']}' (manifest entry {number}): {e}")
+                return False
+            except (KeyError, ValueError, OSError) as e:
+                print(f"Error onboarding manifest entry {number} from '{entry['catalog']}': {type(e).__name__}: {e}")
+                return False
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    with profiler.span("write_output"):
+        write_output(g, output_ontology_file, delta_format)
+    print(f"\nOntology with {len(manifest['entries'])} platform(s) saved to {output_ontology_file}")
+    if check_report:
+        with profiler.span("integrity_check"):
+            check_output(g, check_report)
+    return True
+
 def main():
+    parser = argparse.ArgumentParser(description="Add Singer tap catalogs to the combined ontology.")
+    parser.add_argument("--batch", metavar="MANIFEST", help="JSON manifest of catalogs to onboard without prompts")
+    parser.add_argument("--workers", type=int, default=1, help="build streams in N worker processes (default: 1, serial)")
+    parser.add_argument("--delta", choices=sorted(DELTA_FORMATS), help="append only the triples added by this run to the output file (N-Triples or a Turtle fragment); fold deltas back with delta.py")
+    parser.add_argument("--update", action="store_true", help="re-onboard platforms already in the ontology: keep matching classes and properties, add new fields, deprecate removed ones")
+    parser.add_argument("--key-window", action="store_true", help="also bound generated queries by each stream's replication key ('#replication_key_start' placeholder)")
+    parser.add_argument("--json-mode", choices=JSON_MODES, default="extract", help="'extract' (default): one JSON_EXTRACT_SCALAR per field, as STRING; 'parse': parse each JSON column once per row and cast fields to their schema type")
+    parser.add_argument("--store", choices=sorted(GRAPH_STORES), default="compact", help="triple store for the run: 'compact' (default, integer-interned arrays) or rdflib's 'memory' store")
+    parser.add_argument("--profile", nargs="?", const="onboarding_profile.json", metavar="REPORT", help="write a JSON report of phase and stream timings, triple counts, array depths and peak memory (default: onboarding_profile.json)")
+    parser.add_argument("--check", nargs="?", const="integrity_report.json", metavar="REPORT", help="run the integrity checks (integrity_check.py) on the result and write the findings (default: integrity_report.json)")
+    parser.add_argument("--pstats", metavar="FILE", help="with --profile, also dump cProfile statistics to FILE")
+    args = parser.parse_args()
+
+    profiler = Profiler(args.pstats) if args.profile else NULL_PROFILER
+    if args.pstats and not args.profile:
+        print("Warning: --pstats only takes effect together with --profile.")
+
+    if args.batch:
+        try:
+            manifest = load_manifest(args.batch)
+        except FileNotFoundError:
+            print(f"Error: Manifest file not found at '{args.batch}'")
+            sys.exit(1)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON manifest file '{args.batch}': {e}")
+            sys.exit(1)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        succeeded = run_batch(manifest, args.workers, args.delta, args.update, args.key_window, args.json_mode, args.store, profiler, args.check)
+        if profiler.enabled:
+            profiler.write(args.profile)
+        if not succeeded:
+            sys.exit(1)
+        return
+
     existing_ontology_file = get_file_input("Enter the path to the existing base ontology file (.ttl):", ".ttl")
     catalog_file = get_file_input("Enter the path to the schema catalog file (.json):", ".json")
     output_ontology_file = get_output_file_input()
@@ -575,34 +1187,28 @@ def main():
         return
 
     try:
-        working_ontology = Ontology(existing_ontology_file, catalog_file, output_ontology_file, platform_name, tap_name)
-
-        with open(catalog_file, "r") as f:
-            schema_data = json.load(f)
-
-        platform_name_formatted = working_ontology.string_naming(platform_name)
-        class_uri, property_uri, relationship_uri = working_ontology.ontology_initialization(platform_name_formatted)
-
-        streams = schema_data.get('streams', [])
-        if not streams:
-            print("Warning: No 'streams' found in the catalog file.")
-
-        for single_schema in streams:
-            root_class_name = single_schema.get("stream")
-            if not root_class_name:
-                print("Warning: Skipping stream with missing 'stream' key.")
-                continue
+        with profiler.span("load_base_graph"):
+            g = load_base_graph(existing_ontology_file, args.delta, [platform_name], args.store)
+        with profiler.span("init_platform", g):
+            working_ontology = Ontology(existing_ontology_file, catalog_file, output_ontology_file, platform_name, tap_name, graph=g, update=args.update, key_window=args.key_window, json_mode=args.json_mode)
+        working_ontology.profiler = profiler
 
-            if not single_schema["metadata"][0]["metadata"]["selected"]:
-                print(f"Skipping stream '{root_class_name}' as it is not selected.")
-                continue
-
-            print(f"Processing stream: {root_class_name}...")
-            root_class_name_formatted = working_ontology.string_naming(root_class_name)
-            working_ontology.process_schema(root_class_name_formatted, single_schema, class_uri, property_uri, relationship_uri)
-
-        working_ontology.g.serialize(destination=output_ontology_file, format="turtle")
+        pool = make_pool(args.workers)
+        try:
+            with profiler.span("catalog", g, platform=platform_name, catalog=catalog_file):
+                process_catalog(working_ontology, iter_catalog_streams(catalog_file), pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        with profiler.span("write_output"):
+            write_output(working_ontology.g, output_ontology_file, args.delta)
         print(f"\nOntology successfully generated and saved to {output_ontology_file}")
+        if args.check:
+            with profiler.span("integrity_check"):
+                check_output(working_ontology.g, args.check)
+        if profiler.enabled:
+            profiler.write(args.profile)
 
     except FileNotFoundError as e:
         print(f"Error loading file: {e}")
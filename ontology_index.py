@@ -0,0 +1,142 @@
+from collections import defaultdict
+from rdflib import RDF, RDFS, OWL, URIRef
+from hierarchy_index import HierarchyIndex
+
+# === In-memory adjacency indexes over an ontology graph ===
+# Built in a single pass over the triples so exports and lookups can walk the
+# class/property hierarchies with dictionary lookups instead of SPARQL property paths.
+
+# convert.py has always read the primary key flag from the D2C namespace
+D2C_IS_PRIMARY_KEY = URIRef("https://www.cohesyve.com/ontologies/D2C#isPrimaryKey")
+
+# onto.py writes the primary key flag in the combined namespace
+IS_PRIMARY_KEY = URIRef("https://www.cohesyve.com/ontologies/combined#isPrimaryKey")
+
+# SQL that materializes a platform class, written by onto.py
+QUERY = URIRef("https://www.cohesyve.com/ontologies/combined#query")
+
+
+class OntologyIndex():
+
+    def __init__(self, g, is_primary_key_predicate=D2C_IS_PRIMARY_KEY, hierarchy=None, on_triple=None):
+        """on_triple(s, p, o), if given, is called for every triple during the indexing pass."""
+        self.g = g
+        self.is_primary_key_predicate = is_primary_key_predicate
+
+        self.types = defaultdict(set)
+        self.labels = defaultdict(list)
+        self.defined_by = defaultdict(list)
+        self.domains = defaultdict(list)
+        self.ranges = defaultdict(list)
+        self.sub_class_of = defaultdict(list)      # child -> parents
+        self.super_class_of = defaultdict(list)    # parent -> children
+        self.sub_property_of = defaultdict(list)   # child -> parents
+        self.super_property_of = defaultdict(list) # parent -> children
+        self.properties_by_domain = defaultdict(list)
+        self.equivalent_properties = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.primary_keys = set()
+
+        # === Single pass over the graph ===
+        for s, p, o in g:
+            if on_triple is not None:
+                on_triple(s, p, o)
+            if p == RDF.type:
+                self.types[s].add(o)
+            elif p == RDFS.label:
+                self.labels[s].append(o)
+            elif p == RDFS.isDefinedBy:
+                self.defined_by[s].append(o)
+            elif p == RDFS.domain:
+                self.domains[s].append(o)
+                self.properties_by_domain[o].append(s)
+            elif p == RDFS.range:
+                self.ranges[s].append(o)
+            elif p == RDFS.subClassOf:
+                self.sub_class_of[s].append(o)
+                self.super_class_of[o].append(s)
+            elif p == RDFS.subPropertyOf:
+                self.sub_property_of[s].append(o)
+                self.super_property_of[o].append(s)
+            elif p == OWL.equivalentProperty:
+                self.equivalent_properties[s].append(o)
+            elif p == QUERY:
+                self.queries[s].append(o)
+            elif p == self.is_primary_key_predicate:
+                self.primary_keys.add(s)
+
+        # === Transitive closure of the hierarchies (the cached one for a TTL file, if given) ===
+        self.hierarchy = hierarchy if hierarchy is not None else HierarchyIndex.from_graph(g)
+
+    def property_classes(self, prop):
+        """
+        Returns the classes a property belongs to: its own rdfs:domain values or, failing that, those
+        of its nearest ancestors. Sorted, since a property shared by several classes has one domain each.
+        """
+        seen = {prop}
+        level = [prop]
+        while level:
+            domains = {domain for current in level for domain in self.domains.get(current, ())}
+            if domains:
+                return sorted(domains)
+            parents = [parent for current in level for parent in self.sub_property_of.get(current, ()) if parent not in seen]
+            seen.update(parents)
+            level = parents
+        return []
+
+    def platform_field_classes(self):
+        """
+        Yields (parentClass, parentClassLabel, subClass, subClassLabel, subClassDefinition)
+        for every owl:Class whose parent class label contains 'PlatformField'.
+        """
+        seen = set()
+        for sub_class, parents in self.sub_class_of.items():
+            if OWL.Class not in self.types.get(sub_class, ()):
+                continue
+            sub_labels = self.labels.get(sub_class)
+            definitions = self.defined_by.get(sub_class)
+            if not sub_labels or not definitions:
+                continue
+            for parent_class in parents:
+                for parent_label in self.labels.get(parent_class, ()):
+                    if "PlatformField" not in str(parent_label):
+                        continue
+                    for sub_label in sub_labels:
+                        for definition in definitions:
+                            row = (parent_class, parent_label, sub_class, sub_label, definition)
+                            if row not in seen:
+                                seen.add(row)
+                                yield row
+
+    def class_properties(self, parent_class_uri, subclass_uri):
+        """
+        Returns the distinct (parentPropertyLabel, propertyLabel, subpropertyLabel,
+        subClassDefinition, subpropertyType, isPrimaryKey) rows for a platform entity.
+        """
+        rows = {}
+        class_props = self.properties_by_domain.get(subclass_uri, ())
+        if not class_props:
+            return []
+        for parent_prop in self.properties_by_domain.get(parent_class_uri, ()):
+            if OWL.DatatypeProperty not in self.types.get(parent_prop, ()):
+                continue
+            parent_labels = self.labels.get(parent_prop)
+            if not parent_labels:
+                continue
+            for prop in class_props:
+                if not self.hierarchy.is_descendant(prop, parent_prop):
+                    continue
+                for sub_prop in self.hierarchy.descendants(prop):
+                    sub_labels = self.labels.get(sub_prop)
+                    definitions = self.defined_by.get(sub_prop)
+                    ranges = self.ranges.get(sub_prop)
+                    if not sub_labels or not definitions or not ranges:
+                        continue
+                    is_primary_key = sub_prop in self.primary_keys
+                    for parent_label in parent_labels:
+                        for prop_label in self.labels.get(prop, ()):
+                            for sub_label in sub_labels:
+                                for definition in definitions:
+                                    for range_uri in ranges:
+                                        rows[(parent_label, prop_label, sub_label, definition, range_uri, is_primary_key)] = None
+        return list(rows)
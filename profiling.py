@@ -0,0 +1,177 @@
+import cProfile
+import datetime
+import json
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# === Instrumentation for onboarding runs ===
+# Spans time the phases of a run (base load, each stream, serialize) as a tree; timers
+# aggregate hot spots that run thousands of times (SQL building, foreign-key lookups);
+# counters tally what was created. The report is JSON, optionally with a cProfile dump.
+
+
+def reset_peak_rss():
+    # Linux lets a process reset its RSS high-water mark, which gives per-phase peaks
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """The process's peak resident set size in MB, or None where it can't be read."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _Span():
+
+    __slots__ = ("profiler", "record", "graph", "start", "cpu_start", "triples_start")
+
+    def __init__(self, profiler, record, graph):
+        self.profiler = profiler
+        self.record = record
+        self.graph = graph
+
+    def __enter__(self):
+        self.profiler.stack.append(self.record["children"])
+        self.triples_start = len(self.graph) if self.graph is not None else None
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc):
+        self.record["seconds"] = round(time.perf_counter() - self.start, 6)
+        self.record["cpu_seconds"] = round(time.process_time() - self.cpu_start, 6)
+        if self.triples_start is not None:
+            self.record["triples_added"] = len(self.graph) - self.triples_start
+        peak = peak_rss_mb()
+        self.record["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+        self.profiler.stack.pop()
+        return False
+
+
+class _Timer():
+
+    __slots__ = ("totals", "start")
+
+    def __init__(self, totals):
+        self.totals = totals
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.totals[0] += 1
+        self.totals[1] += time.perf_counter() - self.start
+        return False
+
+
+class _NoOp():
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_OP = _NoOp()
+
+
+class Profiler():
+    """Collects spans, timers, counters and array depths for one run; see report()."""
+
+    enabled = True
+
+    def __init__(self, pstats_file=None):
+        self.created = datetime.datetime.now().isoformat(timespec="seconds")
+        self.spans = []
+        self.stack = [self.spans]
+        self.timers = defaultdict(lambda: [0, 0.0])
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.array_depths = {}
+        self.pstats_file = pstats_file
+        self.cprofile = cProfile.Profile() if pstats_file else None
+        self.start = time.perf_counter()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def span(self, name, graph=None, **attributes):
+        """Times a block as a child of the enclosing span; with a graph, also counts the triples it added."""
+        record = dict(name=name, **attributes, children=[])
+        self.stack[-1].append(record)
+        return _Span(self, record, graph)
+
+    def timed(self, name):
+        """Adds a block's time to an aggregate timer (calls and total seconds)."""
+        return _Timer(self.timers[name])
+
+    def count(self, group, key, n=1):
+        self.counters[group][key] += n
+
+    def record_depth(self, array_path, depth):
+        """Records the nesting depth at which an array was processed."""
+        self.array_depths[array_path] = max(depth, self.array_depths.get(array_path, 0))
+
+    def report(self):
+        peak = peak_rss_mb()
+        return {
+            "created": self.created,
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+            "spans": self.spans,
+            "timers": {name: {"calls": calls, "seconds": round(seconds, 6)} for name, (calls, seconds) in sorted(self.timers.items())},
+            "counters": {group: dict(sorted(values.items())) for group, values in sorted(self.counters.items())},
+            "array_depths": dict(sorted(self.array_depths.items())),
+            "max_array_depth": max(self.array_depths.values(), default=0),
+        }
+
+    def write(self, report_file):
+        """Writes the JSON report, and the cProfile statistics when requested."""
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.pstats_file)
+            print(f"cProfile statistics saved to {self.pstats_file} (read with python -m pstats)")
+        with open(report_file, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Profile report saved to {report_file}")
+
+
+class NullProfiler():
+    """Stands in for Profiler when profiling is off; every hook is a no-op."""
+
+    enabled = False
+
+    def span(self, name, graph=None, **attributes):
+        return _NO_OP
+
+    def timed(self, name):
+        return _NO_OP
+
+    def count(self, group, key, n=1):
+        pass
+
+    def record_depth(self, array_path, depth):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,398 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from catalog_schema import normalize_stream
+from catalog_reader import iter_catalog_streams, is_selected
+import onto
+
+try:
+    import duckdb
+except ImportError:  # only needed to run the queries
+    duckdb = None
+
+# === Local SQL harness for generated queries ===
+# Creates a synthetic tap table for every selected stream of a Singer catalog (JSON text for
+# object and array columns, plus the _time_loaded partition column), transpiles the BigQuery
+# queries onboarding would write for the stream to DuckDB, runs them, and reports for each query
+# whether it ran and returned the expected rows, and how long it took at each row count.
+
+DEFAULT_ROWS = [1000, 100000]
+
+# Values substituted for the placeholders of the generated queries; every synthetic row is later than both
+CUTOFF_TIMESTAMP = "2020-01-01"
+REPLICATION_KEY_START = "2020-01-01 00:00:00"
+LOADED_FROM = datetime.datetime(2024, 1, 1)
+
+# Synthetic data: share of NULLs in nullable non-key fields, and items per array
+NULL_RATE = 0.1
+MAX_ITEMS = 3
+
+
+# === Synthetic tap tables ===
+
+# DuckDB column type of a top-level field, as the BigQuery target loads it
+COLUMN_TYPES = {"integer": "BIGINT", "number": "DOUBLE", "boolean": "BOOLEAN"}
+FORMAT_TYPES = {"date-time": "TIMESTAMP", "date": "DATE"}
+
+
+def column_type(field):
+    if field.type in ("object", "array"):
+        return "VARCHAR"  # JSON text
+    if field.type == "string":
+        return FORMAT_TYPES.get(field.format, "VARCHAR")
+    return COLUMN_TYPES.get(field.type, "VARCHAR")
+
+
+def synthetic_value(field, rng, row):
+    """A random value for a field as a Python value (dicts and lists for objects and arrays); keys are never NULL."""
+    if field.nullable and not field.is_key and rng.random() < NULL_RATE:
+        return None
+    if field.type == "object":
+        return {name: synthetic_value(sub_field, rng, row) for name, sub_field in field.properties.items()}
+    if field.type == "array":
+        if field.items is None:
+            return []
+        return [synthetic_value(field.items, rng, row) for _ in range(rng.randint(0, MAX_ITEMS))]
+    if field.type == "integer":
+        return row if field.is_key else rng.randint(0, 1000000)
+    if field.type == "number":
+        return round(rng.uniform(0, 1000), 2)
+    if field.type == "boolean":
+        return rng.random() < 0.5
+    if field.format in FORMAT_TYPES:
+        moment = LOADED_FROM + datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+        return moment.date().isoformat() if field.format == "date" else moment.isoformat(sep=" ")
+    return f"{field.name or 'value'}-{row}" if field.is_key else f"{field.name or 'value'}-{rng.randint(0, 1000000)}"
+
+
+def unnested_rows(value, array_path):
+    """The rows chained LEFT JOIN UNNESTs along array_path produce for one value: an empty or missing array still gives one."""
+    if not array_path:
+        return 1
+    items = value.get(array_path[0]) if isinstance(value, dict) else None
+    if not items:
+        return 1
+    return sum(unnested_rows(item, array_path[1:]) for item in items)
+
+
+class SyntheticTable():
+    """The tap table of one stream, filled with `count` random rows loaded on or after LOADED_FROM."""
+
+    def __init__(self, tap, stream, count, seed=0):
+        self.stream = stream["stream"]
+        self.name = f"{tap}__{self.stream.lower()}"
+        properties = normalize_stream(stream).properties
+        self.columns = [(name, column_type(field)) for name, field in properties.items() if name != onto.PARTITION_COLUMN]
+        self.columns.append((onto.PARTITION_COLUMN, "TIMESTAMP"))
+
+        rng = random.Random(f"{seed}:{self.stream}")
+        self.rows = []
+        for row in range(count):
+            values = {name: synthetic_value(field, rng, row) for name, field in properties.items()}
+            values[onto.PARTITION_COLUMN] = (LOADED_FROM + datetime.timedelta(seconds=rng.randint(0, 365 * 86400))).isoformat(sep=" ")
+            self.rows.append(values)
+
+    def expected_rows(self, array_path=(), window_key=None):
+        """Rows the query for array_path returns; with window_key, only rows the replication key window keeps."""
+        return sum(unnested_rows(row, array_path) for row in self.rows if window_key is None or in_key_window(row.get(window_key)))
+
+    def load(self, con, work_dir):
+        """Creates the table in a DuckDB connection, bulk-loading the rows through a CSV file."""
+        csv_file = os.path.join(work_dir, f"{self.name}.csv")
+        with open(csv_file, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in self.columns])
+            for row in self.rows:
+                writer.writerow([csv_value(row.get(name)) for name, _ in self.columns])
+        columns = ", ".join(f"{quote_identifier(name)} {sql_type}" for name, sql_type in self.columns)
+        con.execute(f"CREATE OR REPLACE TABLE {quote_identifier(self.name)} ({columns})")
+        con.execute(f"COPY {quote_identifier(self.name)} FROM '{csv_file}' (FORMAT CSV, HEADER)")
+        os.remove(csv_file)
+
+
+def in_key_window(value):
+    """Whether the generated key-window predicate keeps a row: a NULL key, or one at or after REPLICATION_KEY_START."""
+    return value is None or str(value) >= REPLICATION_KEY_START
+
+
+def csv_value(value):
+    if value is None:
+        return None  # an empty field, read back as NULL
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+# === BigQuery to DuckDB ===
+# Covers the constructs the SQL builders in onto.py emit, in both JSON modes.
+
+SQL_TYPES = {"STRING": "VARCHAR", "INT64": "BIGINT", "BOOL": "BOOLEAN", "NUMERIC": "DECIMAL(38, 9)", "FLOAT64": "DOUBLE"}
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _cast(args, function):
+    value, _, sql_type = args[0].rpartition(" AS ")
+    return f"{function}({value} AS {SQL_TYPES.get(sql_type.strip().upper(), sql_type.strip())})"
+
+
+def _json_path(args, suffix=""):
+    path = args[1] if len(args) > 1 else "'$'"
+    return path[:-1] + suffix + "'"
+
+
+def _json_scalar(args):
+    # BigQuery returns NULL for objects and arrays, and for text that isn't JSON
+    value, path = args[0], _json_path(args)
+    return f"TRY(CASE WHEN json_type({value}, {path}) IN ('OBJECT', 'ARRAY') THEN NULL ELSE json_extract_string({value}, {path}) END)"
+
+
+def _json_array(args):
+    return f"TRY(json_extract({args[0]}, {_json_path(args, '[*]')}))"
+
+
+FUNCTIONS = {
+    "SAFE_CAST": lambda args: _cast(args, "TRY_CAST"),
+    "TIMESTAMP": lambda args: f"CAST({args[0]} AS TIMESTAMP)",
+    "DATE": lambda args: f"CAST({args[0]} AS DATE)",
+    "JSON_EXTRACT_SCALAR": _json_scalar,
+    "JSON_VALUE": _json_scalar,
+    "JSON_EXTRACT_ARRAY": _json_array,
+    "JSON_QUERY_ARRAY": _json_array,
+    "JSON_QUERY": lambda args: f"json_extract({args[0]}, {_json_path(args)})",
+    "SAFE.PARSE_JSON": lambda args: f"TRY(CAST({args[0]} AS JSON))",  # wide_number_mode has no DuckDB counterpart
+    "TO_JSON_STRING": lambda args: f"COALESCE(CAST({args[0]} AS VARCHAR), 'null')",
+    "STRUCT": lambda args: f"STRUCT({', '.join(args)})",  # only valid inside UNNEST([...]), see _unnest
+}
+
+_TOKEN = re.compile(r"'(?:[^'\\]|\\.)*'|`[^`]*`|\b(?P<function>" + "|".join(re.escape(name) for name in [*FUNCTIONS, "UNNEST"])
+                    + r")\s*\(|[()\[\],]", re.I)
+_UNNEST_ALIAS = re.compile(r"\s+AS\s+(\w+)", re.I)
+
+
+def _unnest(args, sql, pos, preceding):
+    """UNNEST(array) AS alias becomes a lateral subquery; UNNEST([STRUCT(...)]) AS alias a one-row one."""
+    alias = _UNNEST_ALIAS.match(sql, pos)
+    if alias is None:
+        raise ValueError("UNNEST without an alias")
+    struct = re.fullmatch(r"\[STRUCT\((.*)\)\]", args[0], re.S)
+    if struct:
+        return f"LATERAL (SELECT {struct.group(1)}) AS {alias.group(1)}", alias.end()
+    on = " ON TRUE" if re.search(r"\bLEFT\s+JOIN\s*$", preceding, re.I) else ""
+    return f"LATERAL (SELECT UNNEST({args[0]}) AS {alias.group(1)}) AS {alias.group(1)}{on}", alias.end()
+
+
+def _translate(sql, pos=0, in_call=False):
+    """
+    Translates sql from pos; inside a call, up to its closing parenthesis. Returns the translated
+    arguments (split on top-level commas inside a call, else the whole text) and the position after.
+    """
+    args, current, depth = [], [], 0
+    while True:
+        match = _TOKEN.search(sql, pos)
+        if match is None:
+            current.append(sql[pos:])
+            pos = len(sql)
+            break
+        current.append(sql[pos:match.start()])
+        token, pos = match.group(), match.end()
+        if match.group("function"):
+            name = match.group("function").upper()
+            call_args, pos = _translate(sql, pos, in_call=True)
+            if name == "UNNEST":
+                text, pos = _unnest(call_args, sql, pos, "".join(current))
+            else:
+                text = FUNCTIONS[name](call_args)
+            current.append(text)
+        elif token in "([":
+            depth += 1
+            current.append(token)
+        elif token in ")]":
+            if in_call and depth == 0:
+                break
+            depth -= 1
+            current.append(token)
+        elif token == "," and in_call and depth == 0:
+            args.append("".join(current).strip())
+            current = []
+        elif token.startswith("`"):
+            # `project.#database_id.table` is the tap table, created under its bare name
+            current.append(quote_identifier(token[1:-1].split("#database_id.", 1)[-1]))
+        else:
+            current.append(token)
+    args.append("".join(current).strip() if in_call else "".join(current))
+    return args, pos
+
+
+def transpile(sql, cutoff=CUTOFF_TIMESTAMP, replication_key_start=REPLICATION_KEY_START):
+    """Translates a generated BigQuery query to DuckDB, filling in the cutoff and replication key placeholders."""
+    sql = sql.replace("'#cutoff_timestamp'", f"'{cutoff}'").replace("'#replication_key_start'", f"'{replication_key_start}'")
+    return _translate(sql)[0][0]
+
+
+# === Queries ===
+
+def stream_queries(builder, stream):
+    """
+    Yields (class label, array path, BigQuery SQL) for the class query and every array-item query
+    onboarding writes for a stream; the array path lists the arrays unnested, outermost first.
+    """
+    class_name = builder.string_naming(stream["stream"])
+    properties = normalize_stream(stream).properties
+    keys = stream.get("key_properties", [])
+    yield class_name, (), builder.construct_class_sql_query(class_name, properties, stream)
+
+    def array_queries(fields, label, array_path):
+        for prop_name, field in fields.items():
+            if field.type != "array" or field.items is None:
+                continue
+            item_label = f"{label}{builder.string_naming(prop_name)}Item"
+            ancestors = [(name, builder.array_item_keys(item, keys)) for name, item in array_path]
+            yield item_label, tuple(name for name, _ in array_path) + (prop_name,), builder.construct_nested_sql_query(
+                stream["stream"].lower(), prop_name, field.items, keys, ancestors, stream)
+            if field.items.type == "object":
+                yield from array_queries(field.items.properties, item_label, array_path + ((prop_name, field.items),))
+
+    yield from array_queries(properties, class_name, ())
+
+
+def run_query(con, sql, repeat):
+    """Runs a query `repeat` times; returns its column names, row count, non-NULL count per column and run times."""
+    columns = [column[0] for column in con.execute(f"{sql}\nLIMIT 0").description]
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts = con.execute(f"SELECT count(*), count(COLUMNS(*)) FROM (\n{sql}\n) AS q").fetchone()
+        seconds.append(time.perf_counter() - start)
+    return columns, counts[0], dict(zip(columns, counts[1:])), seconds
+
+
+def check_query(con, table, label, array_path, sql, repeat, window_key=None):
+    """Runs one generated query against its stream's synthetic table and records what went wrong, if anything."""
+    result = {"query": label, "stream": table.stream, "array_path": list(array_path), "table_rows": len(table.rows)}
+    problems = []
+    try:
+        columns, rows, non_null, seconds = run_query(con, transpile(sql), repeat)
+    except (duckdb.Error, ValueError) as e:
+        result.update(status="failed", problems=[f"{type(e).__name__}: {str(e).splitlines()[0]}"], seconds=None)
+        return result
+
+    expected = table.expected_rows(array_path, window_key)
+    if rows != expected:
+        problems.append(f"returned {rows} rows, expected {expected}")
+    duplicates = sorted({column for column in columns if columns.count(column) > 1})
+    if duplicates:
+        problems.append(f"duplicate output columns: {', '.join(duplicates)}")
+    # With NULL_RATE well below 1, a column that is NULL in every row reads the wrong place
+    empty = [column for column, count in non_null.items() if count == 0] if rows else []
+    result.update(status="failed" if problems else "ok", problems=problems, rows=rows, expected_rows=expected,
+                  columns=len(columns), empty_columns=empty,
+                  seconds=round(min(seconds), 5), median_seconds=round(statistics.median(seconds), 5))
+    return result
+
+
+# === Runs ===
+
+def run(catalog_file, tap, row_counts, json_modes, key_window=False, repeat=3, seed=0, output=None):
+    if duckdb is None:
+        raise ImportError("The SQL harness requires duckdb (pip install duckdb)")
+    streams = [stream for stream in iter_catalog_streams(catalog_file) if stream.get("stream") and is_selected(stream)]
+    work_dir = tempfile.mkdtemp(prefix="sql-harness-")
+    results = []
+    try:
+        for count in row_counts:
+            print(f"\n{count} rows per stream")
+            con = duckdb.connect()
+            tables = {}
+            for stream in streams:
+                tables[stream["stream"]] = table = SyntheticTable(tap, stream, count, seed)
+                table.load(con, work_dir)
+            for json_mode in json_modes:
+                builder = onto.Ontology.fragment("Harness", tap, None, None, None, key_window=key_window, json_mode=json_mode)
+                for stream in streams:
+                    queries = list(stream_queries(builder, stream))
+                    # The key the queries were windowed by, if any (known once they are generated)
+                    window_key = builder.window_key(stream) if key_window else None
+                    if window_key == onto.PARTITION_COLUMN:
+                        window_key = None
+                    for label, array_path, sql in queries:
+                        result = check_query(con, tables[stream["stream"]], label, array_path, sql, repeat, window_key)
+                        result["json_mode"] = json_mode
+                        results.append(result)
+                        timing = f"{result['seconds']:8.4f}s" if result["seconds"] is not None else f"{'-':>9}"
+                        print(f"  {json_mode:<8} {label:<48} {result['status']:<6} {timing}  {'; '.join(result['problems'])}")
+            con.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    failed = sum(result["status"] == "failed" for result in results)
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "config": {"catalog": catalog_file, "tap": tap, "rows": row_counts, "json_modes": json_modes,
+                   "key_window": key_window, "repeat": repeat, "seed": seed},
+        "summary": {"queries": len(results), "ok": len(results) - failed, "failed": failed},
+        "results": results,
+    }
+    print(f"\n{len(results) - failed} of {len(results)} query runs ok, {failed} failed")
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Harness results saved to {output}")
+    return report
+
+
+def compare(old_file, new_file):
+    """Prints the per-query time ratio and status changes between two harness result files."""
+    def load(path):
+        with open(path) as f:
+            return {(r["json_mode"], r["table_rows"], r["query"]): r for r in json.load(f)["results"]}
+    old, new = load(old_file), load(new_file)
+    print(f"{'mode':<8} {'rows':>8}  {'query':<48} {'old s':>9} {'new s':>9} {'ratio':>7}  status")
+    for key in sorted(old.keys() & new.keys()):
+        o, n = old[key], new[key]
+        status = o["status"] if o["status"] == n["status"] else f"{o['status']} -> {n['status']}"
+        if o["seconds"] and n["seconds"]:
+            print(f"{key[0]:<8} {key[1]:>8}  {key[2]:<48} {o['seconds']:>9.4f} {n['seconds']:>9.4f} {n['seconds'] / o['seconds']:>6.2f}x  {status}")
+        else:
+            print(f"{key[0]:<8} {key[1]:>8}  {key[2]:<48} {o['seconds']!s:>9} {n['seconds']!s:>9} {'-':>7}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the queries generated for a Singer catalog against synthetic tap tables in DuckDB.")
+    parser.add_argument("catalog", nargs="?", help="Singer catalog (.json)")
+    parser.add_argument("--tap", help="tap name used in the generated table names (e.g. 'razorpay')")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help=f"rows per synthetic table (default: {' '.join(map(str, DEFAULT_ROWS))})")
+    parser.add_argument("--json-mode", choices=onto.JSON_MODES, nargs="+", default=list(onto.JSON_MODES), help="JSON modes to generate queries in (default: both)")
+    parser.add_argument("--key-window", action="store_true", help="generate queries bounded by each stream's replication key")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query; the fastest is reported (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic rows (default: 0)")
+    parser.add_argument("--output", default="sql_harness_results.json", help="results file (default: sql_harness_results.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.catalog or not args.tap:
+        parser.error("a catalog and --tap are required")
+    report = run(args.catalog, args.tap, args.rows, args.json_mode, args.key_window, args.repeat, args.seed, args.output)
+    if report["summary"]["failed"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import json
+from rdflib import Graph, Namespace, RDFS
+from rdflib.compare import isomorphic
+import delta
+import onto
+from hierarchy_index import HierarchyIndex
+
+# === Regression tests ===
+# Cover the guarantees the batch tooling relies on: subClassOf closures over cycles,
+# byte-identical output from re-running a manifest, and delta + compact matching a full run.
+
+EX = Namespace("http://example.com/test#")
+
+BASE_TTL = """\
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix combined: <https://www.cohesyve.com/ontologies/combined#> .
+
+combined:maduz-holot-kogit-sojal a owl:Class ;
+    rdfs:label "Platform"@en .
+
+combined:bafab-dikog-fohan-gipaj a owl:Class ;
+    rdfs:label "SalesPlatform"@en ;
+    rdfs:subClassOf combined:maduz-holot-kogit-sojal .
+"""
+
+CATALOG = {"streams": [
+    {"stream": "orders", "tap_stream_id": "orders", "key_properties": ["id"],
+     "schema": {"type": "object", "properties": {
+         "id": {"type": ["null", "integer"]},
+         "updated_at": {"type": ["null", "string"], "format": "date-time"},
+         "customer": {"type": ["null", "object"], "properties": {
+             "id": {"type": ["null", "integer"]}, "email": {"type": ["null", "string"]}}},
+         "line_items": {"type": ["null", "array"], "items": {"type": ["null", "object"], "properties": {
+             "id": {"type": ["null", "integer"]}, "price": {"type": ["null", "number"]},
+             "tax_lines": {"type": ["null", "array"], "items": {"type": ["null", "object"], "properties": {
+                 "rate": {"type": ["null", "number"]}}}}}}},
+         "tags": {"type": ["null", "array"], "items": {"type": ["null", "string"]}}}},
+     "metadata": [{"breadcrumb": [], "metadata": {"selected": True, "replication-key": "updated_at"}}]},
+    {"stream": "customers", "tap_stream_id": "customers", "key_properties": ["id"],
+     "schema": {"type": "object", "properties": {
+         "id": {"type": "integer"}, "verified": {"type": ["null", "boolean"]}}},
+     "metadata": [{"breadcrumb": [], "metadata": {"selected": True}}]},
+]}
+
+
+def write_manifest(tmp_path, output):
+    """Writes the base ontology, catalog and a manifest onboarding it; returns the manifest as loaded."""
+    (tmp_path / "base.ttl").write_text(BASE_TTL)
+    (tmp_path / "catalog.json").write_text(json.dumps(CATALOG))
+    manifest_file = tmp_path / f"{output}.manifest.json"
+    manifest_file.write_text(json.dumps({
+        "base_ontology": "base.ttl", "output": output,
+        "entries": [{"catalog": "catalog.json", "platform": "Testplat", "tap": "testtap", "category": "Sales"}],
+    }))
+    return onto.load_manifest(str(manifest_file))
+
+
+# === Hierarchy closure ===
+
+def test_closure_over_subclass_cycle():
+    g = Graph()
+    for child, parent in [("A", "B"), ("B", "A"), ("C", "A"), ("D", "B"), ("E", "E"), ("B", "F")]:
+        g.add((EX[child], RDFS.subClassOf, EX[parent]))
+    hierarchy = HierarchyIndex.from_graph(g)
+
+    for term in "ABCDEF":
+        uri = EX[term]
+        expected_ancestors = set(g.transitive_objects(uri, RDFS.subClassOf)) - {uri}
+        expected_descendants = set(g.transitive_subjects(RDFS.subClassOf, uri)) - {uri}
+        # Terms on a cycle share its whole closure, never counting themselves
+        assert set(hierarchy.ancestors(uri, "class")) == expected_ancestors, term
+        assert set(hierarchy.descendants(uri, "class")) == expected_descendants, term
+
+    assert hierarchy.is_descendant(EX.D, EX.A, "class")
+    assert hierarchy.is_descendant(EX.A, EX.D, "class") is False
+    reloaded = HierarchyIndex.from_payload(hierarchy.to_payload())
+    assert set(reloaded.descendants(EX.F, "class")) == {EX.A, EX.B, EX.C, EX.D}
+
+
+# === Batch onboarding ===
+
+def test_rerun_is_byte_identical(tmp_path):
+    first = write_manifest(tmp_path, "first.ttl")
+    second = write_manifest(tmp_path, "second.ttl")
+    parallel = write_manifest(tmp_path, "parallel.ttl")
+    assert onto.run_batch(first)
+    assert onto.run_batch(second)
+    assert onto.run_batch(parallel, workers=2)
+    expected = (tmp_path / "first.ttl").read_bytes()
+    assert (tmp_path / "second.ttl").read_bytes() == expected
+    assert (tmp_path / "parallel.ttl").read_bytes() == expected
+
+
+def test_delta_compacts_to_full_output(tmp_path):
+    full = write_manifest(tmp_path, "full.ttl")
+    assert onto.run_batch(full)
+    partial = write_manifest(tmp_path, "run.nt")
+    assert onto.run_batch(partial, delta_format="nt")
+
+    compacted = delta.compact(str(tmp_path / "base.ttl"), [str(tmp_path / "run.nt")], str(tmp_path / "compacted.ttl"))
+    assert isomorphic(compacted, Graph().parse(str(tmp_path / "full.ttl"), format="turtle"))
@@ -0,0 +1,83 @@
+import hashlib
+from rdflib import URIRef
+
+# === Deterministic, collision-checked slugs for ontology URIs ===
+# Slugs are 64 bits of a SHA-256 over the entity's identifying key, written as four
+# proquint groups (consonant-vowel-consonant-vowel-consonant), the same five-letter
+# format as the hand-made slugs in the ontology, e.g. 'maduz-holot-kogit-sojal'.
+# Identical inputs therefore give identical URIs; a set of used slugs catches collisions.
+
+CONSONANTS = "bdfghjklmnprstvz"
+VOWELS = "aiou"
+
+OWNED_NAMESPACE = "https://www.cohesyve.com/ontologies/"
+
+
+def proquint(value, groups=4):
+    """Encodes the low 16*groups bits of an integer as dash-separated proquint groups."""
+    parts = []
+    for shift in range((groups - 1) * 16, -1, -16):
+        word = (value >> shift) & 0xFFFF
+        parts.append(
+            CONSONANTS[(word >> 12) & 0xF]
+            + VOWELS[(word >> 10) & 0x3]
+            + CONSONANTS[(word >> 6) & 0xF]
+            + VOWELS[(word >> 4) & 0x3]
+            + CONSONANTS[word & 0xF]
+        )
+    return "-".join(parts)
+
+
+def slug_for(key, attempt=0):
+    """Returns the slug for a key (a tuple of strings); later attempts rehash with a counter."""
+    material = "\x1f".join(str(part) for part in key)
+    if attempt:
+        material += f"\x1e{attempt}"
+    digest = hashlib.sha256(material.encode("utf-8")).digest()
+    return proquint(int.from_bytes(digest[:8], "big"))
+
+
+def slug_of(uri):
+    """Returns the fragment of an ontology URI (the part after '#'), or None."""
+    uri = str(uri)
+    return uri.rsplit("#", 1)[1] if "#" in uri else None
+
+
+class SlugAllocator():
+
+    def __init__(self, used=()):
+        self.used = set(used)
+        self.allocated = []
+
+    @classmethod
+    def from_graph(cls, g):
+        """Seeds the used set with every slug already present in the graph's ontology namespaces."""
+        used = set()
+        for triple in g:
+            for term in triple:
+                if isinstance(term, URIRef) and term.startswith(OWNED_NAMESPACE):
+                    slug = slug_of(term)
+                    if slug:
+                        used.add(slug)
+        return cls(used)
+
+    def allocate(self, *key):
+        """Returns a slug derived from the key that is not yet used, and marks it used."""
+        attempt = 0
+        slug = slug_for(key)
+        while slug in self.used:
+            attempt += 1
+            slug = slug_for(key, attempt)
+        self.used.add(slug)
+        self.allocated.append(slug)
+        return slug
+
+    def reserve(self, slugs):
+        """
+        Marks slugs allocated elsewhere as used, unless any of them is already taken.
+        Returns the taken ones (nothing is reserved in that case).
+        """
+        collisions = [slug for slug in slugs if slug in self.used]
+        if not collisions:
+            self.used.update(slugs)
+        return collisions